@@ -7,6 +7,7 @@ import tempfile
 import shutil
 import traceback
 import json
+import re
 
 # Import all the processing functions
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -15,12 +16,30 @@ from converters import (
     convert_pdf_to_docx,
     split_docx_by_heading,
     split_docx_by_heading_v2,
+    split_docx_streaming,
     rename_files_batch,
     extract_icn_from_docx,
+    iter_extract_icn,
+    list_docx_files,
+    document_pool,
+    ICN_LAYOUTS,
+    IMAGE_FORMAT_CHOICES,
     generate_icn_labels,
+    iter_generate_icn_labels,
+    list_icn_sequences,
     validate_adoc_images,
+    iter_validate_adoc_images,
+    validate_dm_images,
+    iter_validate_dm_images,
+    list_icn_images,
+    sync_icn_catalog,
+    validate_icn_catalog,
     generate_rename_preview_from_excel,
     execute_rename_from_excel,
+    load_excel_mapping,
+    plan_rename_rules,
+    compile_rename_rules,
+    RENAME_REPORT_NAME,
     convert_adoc_to_s1000d
 )
 
@@ -35,6 +54,12 @@ app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 # Load feature flags
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')
 
+# ICN SQ numbers handed out so far, per ICN prefix (shared by all gunicorn workers).
+# Kept under uploads/, which docker-compose mounts, so it survives container rebuilds.
+ICN_SEQUENCE_DB = os.environ.get(
+    'ICN_SEQUENCE_DB', os.path.join(os.path.dirname(__file__), 'uploads', 'icn_sequences.db')
+)
+
 def load_config():
     try:
         with open(CONFIG_PATH, 'r') as f:
@@ -76,6 +101,31 @@ def cleanup_temp_files(*paths):
         except Exception as e:
             print(f"Error cleaning up {path}: {e}")
 
+# Helper to read the splitter heading levels from the form.
+# 'heading_levels' may be repeated, a JSON list or a comma separated string,
+# outermost level first; falls back to the single 'heading_style' field.
+def get_heading_styles():
+    levels = [l.strip() for l in request.form.getlist('heading_levels') if l.strip()]
+    if len(levels) == 1:
+        raw = levels[0]
+        if raw.startswith('['):
+            try:
+                levels = [str(l).strip() for l in json.loads(raw) if str(l).strip()]
+            except ValueError:
+                pass
+        elif ',' in raw:
+            levels = [l.strip() for l in raw.split(',') if l.strip()]
+    if levels:
+        return levels
+    return request.form.get('heading_style', 'Heading 1')
+
+# Splitter V2 engine: 'streaming' selects the bounded-memory iterparse splitter
+# for very large documents, anything else the python-docx based splitter
+def get_v2_splitter():
+    if request.form.get('engine') == 'streaming':
+        return split_docx_streaming
+    return split_docx_by_heading_v2
+
 # Route 1: DOCX to S1000D AsciiDoc Converter (Batch Support)
 @app.route('/api/convert/docx-to-s1000d', methods=['POST'])
 def docx_to_s1000d():
@@ -444,7 +494,114 @@ def download_converted_pdf(download_id):
     return jsonify({'error': 'Download not found or expired'}), 404
 
 
-# Route 3: DOCX Splitter
+# Helpers for the DOCX splitter routes
+def get_split_uploads():
+    """Uploaded DOCX files from the 'files' list, falling back to the single 'file' field"""
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files and 'file' in request.files and request.files['file'].filename:
+        files = [request.files['file']]
+    return files
+
+def save_split_uploads(files, prefix, unique_id):
+    """Save uploads under UPLOAD_FOLDER and return [(unique base name, input path)]"""
+    saved = []
+    used_names = set()
+    for file in files:
+        filename = secure_filename(file.filename)
+        input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{prefix}_input_{unique_id}_{len(saved)}_{filename}')
+        file.save(input_path)
+        base_name = os.path.splitext(filename)[0] or 'document'
+        name, n = base_name, 1
+        while name in used_names:
+            n += 1
+            name = f'{base_name}_{n}'
+        used_names.add(name)
+        saved.append((name, input_path))
+    return saved
+
+def get_split_rename_mapping(prefix, unique_id):
+    """
+    Load the optional 'excel_file' Doc Name -> DMC Code sheet for a fused split-and-rename.
+    Returns (mapping or None, error message or None).
+    """
+    excel_file = request.files.get('excel_file')
+    if not excel_file or not excel_file.filename:
+        return None, None
+    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{prefix}_excel_{unique_id}_{secure_filename(excel_file.filename)}')
+    excel_file.save(excel_path)
+    try:
+        result = load_excel_mapping(excel_path)
+    finally:
+        cleanup_temp_files(excel_path)
+    return result.get('mapping'), result.get('error')
+
+def with_rename_mapping(splitter, mapping):
+    """Bind an Excel mapping to a splitter; a partial still pickles for the worker pool"""
+    if mapping is None:
+        return splitter
+    import functools
+    return functools.partial(splitter, rename_mapping=mapping)
+
+def read_unmatched_count(output_dir):
+    """Number of sections a fused split-and-rename left unmatched, or None without a mapping"""
+    report_path = os.path.join(output_dir, RENAME_REPORT_NAME)
+    if not os.path.exists(report_path):
+        return None
+    with open(report_path, encoding='utf-8') as f:
+        return len(json.load(f).get('unmatched', []))
+
+def split_documents_parallel(splitter, inputs, output_dir, heading_style, zip_path):
+    """
+    Split several documents in parallel worker processes, one output tree per input
+    (output_dir/<name>/...). Each tree is added to the archive at zip_path as soon as its
+    document finishes, then removed from disk. Yields (name, count, unmatched, error) per
+    document, where unmatched is None unless an Excel mapping was bound to the splitter;
+    a document that yields no section is reported as failed.
+    """
+    import zipfile
+    from concurrent.futures import as_completed
+
+    with document_pool(len(inputs)) as executor, \
+            zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        futures = {}
+        for name, input_path in inputs:
+            doc_dir = os.path.join(output_dir, name)
+            futures[executor.submit(splitter, input_path, doc_dir, heading_style)] = (name, doc_dir)
+
+        for future in as_completed(futures):
+            name, doc_dir = futures[future]
+            try:
+                count, error = future.result(), None
+            except Exception as e:
+                count, error = 0, str(e)[:200]
+            if not count and error is None:
+                error = 'No sections were written'
+            unmatched = read_unmatched_count(doc_dir)
+            for root, _, names in os.walk(doc_dir):
+                for entry in sorted(names):
+                    path = os.path.join(root, entry)
+                    archive.write(path, os.path.relpath(path, output_dir))
+            cleanup_temp_files(doc_dir)
+            yield name, count, unmatched, error
+
+def send_split_batch(splitter, inputs, output_dir, heading_style, zip_path):
+    """Run a multi-document split and send the combined archive"""
+    results = list(split_documents_parallel(splitter, inputs, output_dir, heading_style, zip_path))
+    failed = [(name, error) for name, _, _, error in results if error]
+    if len(failed) == len(results):
+        return jsonify({'error': 'No documents were split', 'failed': [{'filename': n, 'error': e} for n, e in failed]}), 500
+
+    response = send_file(zip_path, as_attachment=True, download_name='split_documents.zip')
+    response.headers['X-Converted-Count'] = str(len(results) - len(failed))
+    response.headers['X-Total-Count'] = str(len(results))
+    response.headers['X-Failed-Count'] = str(len(failed))
+    response.headers['X-Section-Count'] = str(sum(count for _, count, _, _ in results))
+    unmatched = [u for _, _, u, _ in results if u is not None]
+    if unmatched:
+        response.headers['X-Unmatched-Count'] = str(sum(unmatched))
+    return response
+
+# Route 3: DOCX Splitter (one or many documents)
 @app.route('/api/split-docx', methods=['POST'])
 def split_docx():
     feature_check = check_feature('doc_splitter')
@@ -454,34 +611,43 @@ def split_docx():
     temp_dirs = []
     zip_path = None
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        heading_style = request.form.get('heading_style', 'Heading 1')
+        files = get_split_uploads()
+        heading_style = get_heading_styles()
         
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        if not files:
+            return jsonify({'error': 'No file provided'}), 400
         
         # Create unique directories for this request
         import uuid
         unique_id = str(uuid.uuid4())[:8]
-        filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'split_input_{unique_id}_{filename}')
-        file.save(input_path)
-        temp_dirs.append(input_path)
+        inputs = save_split_uploads(files, 'split', unique_id)
+        temp_dirs.extend(path for _, path in inputs)
+        
+        # Optional Excel sheet naming each section after its DMC code
+        mapping, error = get_split_rename_mapping('split', unique_id)
+        if error:
+            return jsonify({'error': error}), 400
+        splitter = with_rename_mapping(split_docx_by_heading, mapping)
         
         output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'split_output_{unique_id}')
         os.makedirs(output_dir, exist_ok=True)
         temp_dirs.append(output_dir)
+        zip_path = output_dir + '.zip'
+        
+        if len(inputs) > 1:
+            return send_split_batch(splitter, inputs, output_dir, heading_style, zip_path)
         
-        count = split_docx_by_heading(input_path, output_dir, heading_style)
+        name, input_path = inputs[0]
+        count = splitter(input_path, output_dir, heading_style)
+        unmatched = read_unmatched_count(output_dir)
         
         # Create a ZIP file of the output directory
-        zip_path = output_dir + '.zip'
         shutil.make_archive(output_dir, 'zip', output_dir)
         
-        return send_file(zip_path, as_attachment=True, download_name=f'{os.path.splitext(filename)[0]}_split.zip')
+        response = send_file(zip_path, as_attachment=True, download_name=f'{name}_split.zip')
+        if unmatched is not None:
+            response.headers['X-Unmatched-Count'] = str(unmatched)
+        return response
     except Exception as e:
         error_trace = traceback.format_exc()
         error_details = {
@@ -490,7 +656,7 @@ def split_docx():
             'traceback': error_trace,
             'type': 'split_error'
         }
-        print(f"[ERROR] Split failed for {file.filename if 'file' in locals() else 'unknown'}:\\n{error_trace}", file=sys.stderr)
+        print(f"[ERROR] Split failed for {', '.join(f.filename for f in files) if 'files' in locals() else 'unknown'}:\\n{error_trace}", file=sys.stderr)
         return jsonify(error_details), 500
     finally:
         for temp_dir in temp_dirs:
@@ -498,7 +664,7 @@ def split_docx():
         if zip_path:
             cleanup_temp_files(zip_path)
 
-# Route 3b: Document Splitter V2 (Enhanced)
+# Route 3b: Document Splitter V2 (Enhanced, one or many documents)
 @app.route('/api/split-docx-v2', methods=['POST'])
 def split_docx_v2():
     feature_check = check_feature('doc_splitter_v2')
@@ -508,34 +674,44 @@ def split_docx_v2():
     temp_dirs = []
     zip_path = None
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+        files = get_split_uploads()
+        heading_style = get_heading_styles()
+        splitter = get_v2_splitter()
         
-        file = request.files['file']
-        heading_style = request.form.get('heading_style', 'Heading 1')
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        if not files:
+            return jsonify({'error': 'No file provided'}), 400
         
         # Create unique directories for this request
         import uuid
         unique_id = str(uuid.uuid4())[:8]
-        filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'split_v2_input_{unique_id}_{filename}')
-        file.save(input_path)
-        temp_dirs.append(input_path)
+        inputs = save_split_uploads(files, 'split_v2', unique_id)
+        temp_dirs.extend(path for _, path in inputs)
+        
+        # Optional Excel sheet naming each section after its DMC code
+        mapping, error = get_split_rename_mapping('split_v2', unique_id)
+        if error:
+            return jsonify({'error': error}), 400
+        splitter = with_rename_mapping(splitter, mapping)
         
         output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'split_v2_output_{unique_id}')
         os.makedirs(output_dir, exist_ok=True)
         temp_dirs.append(output_dir)
+        zip_path = output_dir + '.zip'
         
-        count = split_docx_by_heading_v2(input_path, output_dir, heading_style)
+        if len(inputs) > 1:
+            return send_split_batch(splitter, inputs, output_dir, heading_style, zip_path)
+        
+        name, input_path = inputs[0]
+        count = splitter(input_path, output_dir, heading_style)
+        unmatched = read_unmatched_count(output_dir)
         
         # Create a ZIP file of the output directory
-        zip_path = output_dir + '.zip'
         shutil.make_archive(output_dir, 'zip', output_dir)
         
-        return send_file(zip_path, as_attachment=True, download_name=f'{os.path.splitext(filename)[0]}_split_v2.zip')
+        response = send_file(zip_path, as_attachment=True, download_name=f'{name}_split_v2.zip')
+        if unmatched is not None:
+            response.headers['X-Unmatched-Count'] = str(unmatched)
+        return response
     except Exception as e:
         error_trace = traceback.format_exc()
         error_details = {
@@ -544,7 +720,7 @@ def split_docx_v2():
             'traceback': error_trace,
             'type': 'split_v2_error'
         }
-        print(f"[ERROR] Split V2 failed for {file.filename if 'file' in locals() else 'unknown'}:\\n{error_trace}", file=sys.stderr)
+        print(f"[ERROR] Split V2 failed for {', '.join(f.filename for f in files) if 'files' in locals() else 'unknown'}:\\n{error_trace}", file=sys.stderr)
         return jsonify(error_details), 500
     finally:
         for temp_dir in temp_dirs:
@@ -552,6 +728,225 @@ def split_docx_v2():
         if zip_path:
             cleanup_temp_files(zip_path)
 
+
+def sse_response(generator):
+    """Wrap an SSE generator in a streaming response"""
+    response = Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'Pragma': 'no-cache',
+            'Expires': '0',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*'
+        }
+    )
+    response.headers['Content-Type'] = 'text/event-stream; charset=utf-8'
+    return response
+
+
+# SSE endpoint for Document Splitter V2 with per-section progress
+@app.route('/api/split-docx-v2/stream', methods=['POST'])
+def split_docx_v2_stream():
+    """
+    Stream document splitting progress. A single document reports one event per section
+    written; several documents are split in parallel with one event per document.
+    """
+    feature_check = check_feature('doc_splitter_v2')
+    if feature_check:
+        return feature_check
+
+    files = get_split_uploads()
+    heading_style = get_heading_styles()
+    splitter = get_v2_splitter()
+
+    if not files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    import uuid
+    unique_id = str(uuid.uuid4())[:8]
+    inputs = save_split_uploads(files, 'split_v2', unique_id)
+
+    mapping, error = get_split_rename_mapping('split_v2', unique_id)
+    if error:
+        for _, input_path in inputs:
+            cleanup_temp_files(input_path)
+        return jsonify({'error': error}), 400
+    splitter = with_rename_mapping(splitter, mapping)
+
+    output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'split_v2_output_{unique_id}')
+    os.makedirs(output_dir, exist_ok=True)
+
+    def generate_sections():
+        import json as json_module
+        import threading
+        from queue import Queue
+
+        name, input_path = inputs[0]
+        filename = secure_filename(files[0].filename)
+        event_queue = Queue()
+
+        def on_progress(current, total, out_path):
+            event_queue.put(('progress', current, total, out_path))
+
+        def run_split():
+            try:
+                count = splitter(input_path, output_dir, heading_style, on_progress)
+                event_queue.put(('done', count, None, None))
+            except Exception as e:
+                traceback.print_exc()
+                event_queue.put(('error', str(e)[:200], None, None))
+
+        worker = threading.Thread(target=run_split, daemon=True)
+        worker.start()
+
+        count = 0
+        kind = None
+        while True:
+            try:
+                kind, current, total, out_path = event_queue.get(timeout=600)
+            except Exception as e:
+                app.logger.error(f"Error in split stream: {e}")
+                yield f"data: {json_module.dumps({'type': 'error', 'message': 'Splitting timed out'})}\n\n"
+                break
+
+            if kind == 'progress' and out_path is None:
+                yield f"data: {json_module.dumps({'type': 'start', 'total': total, 'filename': filename})}\n\n"
+            elif kind == 'progress':
+                section = os.path.relpath(out_path, output_dir).replace(os.path.sep, '/')
+                yield f"data: {json_module.dumps({'type': 'progress', 'current': current, 'total': total, 'filename': section, 'status': 'completed'})}\n\n"
+            elif kind == 'done':
+                count = current
+                break
+            else:
+                yield f"data: {json_module.dumps({'type': 'error', 'message': current})}\n\n"
+                break
+
+        worker.join(timeout=1)
+        cleanup_temp_files(input_path)
+
+        if count > 0:
+            complete = {'type': 'complete', 'converted': count, 'failed': 0, 'total': count, 'download_id': unique_id}
+            unmatched = read_unmatched_count(output_dir)
+            if unmatched is not None:
+                complete['unmatched'] = unmatched
+            shutil.make_archive(output_dir, 'zip', output_dir)
+            yield f"data: {json_module.dumps(complete)}\n\n"
+        elif kind == 'done':
+            yield f"data: {json_module.dumps({'type': 'error', 'message': 'No sections were written'})}\n\n"
+
+    def generate_documents():
+        import json as json_module
+
+        total_files = len(inputs)
+        yield f"data: {json_module.dumps({'type': 'start', 'total': total_files})}\n\n"
+
+        converted_count = 0
+        failed_count = 0
+        sections = 0
+        unmatched_total = None
+        completed = 0
+        try:
+            for name, count, unmatched, error in split_documents_parallel(splitter, inputs, output_dir, heading_style, output_dir + '.zip'):
+                completed += 1
+                if error is None:
+                    converted_count += 1
+                    sections += count
+                    progress = {'type': 'progress', 'current': completed, 'total': total_files, 'filename': name, 'sections': count, 'status': 'completed'}
+                    if unmatched is not None:
+                        progress['unmatched'] = unmatched
+                        unmatched_total = (unmatched_total or 0) + unmatched
+                    yield f"data: {json_module.dumps(progress)}\n\n"
+                else:
+                    failed_count += 1
+                    yield f"data: {json_module.dumps({'type': 'progress', 'current': completed, 'total': total_files, 'filename': name, 'status': 'failed', 'error': error})}\n\n"
+        except Exception as e:
+            app.logger.error(f"Error in split stream: {e}")
+        finally:
+            for _, input_path in inputs:
+                cleanup_temp_files(input_path)
+
+        if converted_count > 0:
+            complete = {'type': 'complete', 'converted': converted_count, 'failed': failed_count, 'total': total_files, 'sections': sections, 'download_id': unique_id}
+            if unmatched_total is not None:
+                complete['unmatched'] = unmatched_total
+            yield f"data: {json_module.dumps(complete)}\n\n"
+        else:
+            yield f"data: {json_module.dumps({'type': 'error', 'message': 'No documents were split successfully'})}\n\n"
+
+    generate = generate_sections if len(inputs) == 1 else generate_documents
+
+    return sse_response(generate())
+
+
+# Download endpoint for streamed document splits
+@app.route('/api/split-docx-v2/download/<download_id>', methods=['GET'])
+def download_split_docx_v2(download_id):
+    """Download the split sections after a streaming split"""
+    output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'split_v2_output_{secure_filename(download_id)}')
+    zip_path = output_dir + '.zip'
+
+    if os.path.exists(zip_path):
+        return send_file(zip_path, as_attachment=True, download_name='split_documents_v2.zip')
+
+    return jsonify({'error': 'Download not found or expired'}), 404
+
+# Manifest (metadata-only) rename mode: the client sends file names instead of file
+# contents and applies the returned plan locally
+def get_rename_manifest():
+    """
+    Files listed in a 'manifest' (JSON body key or form field): a list of names or of
+    {'name', 'size', 'hash'} objects. Returns {name: metadata} or None when no manifest
+    was sent; raises ValueError when it is malformed or two entries share a base name.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    raw = data.get('manifest') if isinstance(data, dict) else request.form.get('manifest')
+    if raw is None:
+        return None
+    entries = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(entries, list):
+        raise ValueError('manifest must be a list of file names')
+    
+    manifest = {}
+    paths = {}
+    for entry in entries:
+        meta = dict(entry) if isinstance(entry, dict) else {'name': entry}
+        if not isinstance(meta.get('name'), str) or not meta['name'].strip():
+            raise ValueError('manifest entries need a file name')
+        # Only the base name is planned; the client keeps track of where its files live
+        path = meta.pop('name').replace('\\', '/')
+        name = os.path.basename(path)
+        if name in manifest:
+            raise ValueError(f'{paths[name]} and {path} share the file name {name}; rename them one folder at a time')
+        paths[name] = path
+        manifest[name] = {k: meta[k] for k in ('size', 'hash') if k in meta}
+    return manifest
+
+def get_rename_rules(params):
+    """
+    Compiled rename rules from 'rules' (a JSON list, see compile_rename_rules) or the single
+    old_text -> new_text replacement. Returns None when neither was given; raises ValueError
+    for invalid rules.
+    """
+    raw = params.get('rules')
+    if raw:
+        rules = json.loads(raw) if isinstance(raw, str) else raw
+        if not isinstance(rules, list):
+            raise ValueError('rules must be a list')
+    elif params.get('old_text'):
+        rules = [{'type': 'literal', 'find': params['old_text'], 'replace': params.get('new_text', ''), 'scope': 'filename'}]
+    else:
+        return None
+    return compile_rename_rules(rules)
+
+def with_manifest_metadata(plan, manifest):
+    """Echo each file's size/hash from the manifest back into its plan entry"""
+    for item in plan:
+        item.update(manifest.get(item['original_name'], {}))
+    return plan
+
 # Route 4: File Renamer
 @app.route('/api/rename-files', methods=['POST'])
 def rename_files():
@@ -562,11 +957,26 @@ def rename_files():
     temp_dir = None
     zip_path = None
     try:
+        params = (request.get_json(silent=True) if request.is_json else request.form) or {}
+        try:
+            manifest = get_rename_manifest()
+        except ValueError as e:
+            return jsonify({'error': f'Invalid manifest: {e}'}), 400
+        try:
+            rules = get_rename_rules(params)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid rename rules: {e}'}), 400
+        dry_run = str(params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        
+        if manifest is not None:
+            if not manifest or not rules:
+                return jsonify({'error': 'Missing required parameters'}), 400
+            plan = plan_rename_rules(list(manifest), rules)
+            return jsonify({'plan': with_manifest_metadata(plan, manifest), 'count': len(plan)})
+        
         files = request.files.getlist('files')
-        old_text = request.form.get('old_text', '')
-        new_text = request.form.get('new_text', '')
         
-        if not files or not old_text:
+        if not files or not rules:
             return jsonify({'error': 'Missing required parameters'}), 400
         
         # Create unique directory for this request
@@ -580,14 +990,18 @@ def rename_files():
             filename = secure_filename(file.filename)
             file.save(os.path.join(temp_dir, filename))
         
-        # Rename files
-        count = rename_files_batch(temp_dir, old_text, new_text)
+        if dry_run:
+            plan = plan_rename_rules(os.listdir(temp_dir), rules)
+            return jsonify({'plan': plan, 'count': len(plan)})
         
-        # Create a ZIP file
+        # Rename files straight into the ZIP file
         zip_path = temp_dir + '.zip'
-        shutil.make_archive(temp_dir, 'zip', temp_dir)
+        count, errors = rename_files_batch(temp_dir, rules, zip_path)
         
-        return send_file(zip_path, as_attachment=True, download_name='renamed_files.zip')
+        response = send_file(zip_path, as_attachment=True, download_name='renamed_files.zip')
+        response.headers['X-Renamed-Count'] = str(count)
+        response.headers['X-Failed-Count'] = str(len(errors))
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -596,6 +1010,58 @@ def rename_files():
         if zip_path:
             cleanup_temp_files(zip_path)
 
+# Excel renamer sessions: the uploaded DOCX files and the preview live in a folder
+# under UPLOAD_FOLDER, so any gunicorn worker can execute a preview made by another.
+# The client only holds the opaque session id; unused sessions are reclaimed after
+# RENAME_SESSION_TTL seconds.
+RENAME_SESSION_TTL = 30 * 60
+RENAME_SESSION_PREFIX = 'excel_rename_session_'
+RENAME_SESSION_STATE = 'session.json'
+
+def expire_rename_sessions():
+    """Remove rename sessions not saved or used within RENAME_SESSION_TTL"""
+    import time
+    now = time.time()
+    for entry in os.listdir(app.config['UPLOAD_FOLDER']):
+        if not entry.startswith(RENAME_SESSION_PREFIX):
+            continue
+        session_dir = os.path.join(app.config['UPLOAD_FOLDER'], entry)
+        state_path = os.path.join(session_dir, RENAME_SESSION_STATE)
+        try:
+            last_used = os.path.getmtime(state_path if os.path.exists(state_path) else session_dir)
+        except OSError:
+            continue
+        if now - last_used > RENAME_SESSION_TTL:
+            cleanup_temp_files(session_dir)
+
+def create_rename_session():
+    """Start a rename session; returns (session_id, session_dir) with docx_files/ created"""
+    import uuid
+    expire_rename_sessions()
+    session_id = uuid.uuid4().hex
+    session_dir = os.path.join(app.config['UPLOAD_FOLDER'], RENAME_SESSION_PREFIX + session_id)
+    os.makedirs(os.path.join(session_dir, 'docx_files'))
+    return session_id, session_dir
+
+def save_rename_session(session_dir, state):
+    """Store the preview result of a session"""
+    state_path = os.path.join(session_dir, RENAME_SESSION_STATE)
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+
+def load_rename_session(session_id):
+    """Return (session_dir, state) of a live session, or (None, None) if unknown or expired"""
+    if not isinstance(session_id, str) or not re.fullmatch(r'[0-9a-f]{32}', session_id):
+        return None, None
+    expire_rename_sessions()
+    session_dir = os.path.join(app.config['UPLOAD_FOLDER'], RENAME_SESSION_PREFIX + session_id)
+    try:
+        with open(os.path.join(session_dir, RENAME_SESSION_STATE), encoding='utf-8') as f:
+            return session_dir, json.load(f)
+    except (OSError, ValueError):
+        return None, None
+
 # Route 4b: Excel Rename Preview
 @app.route('/api/rename-preview', methods=['POST'])
 def rename_preview():
@@ -608,43 +1074,82 @@ def rename_preview():
             return jsonify({'error': 'No Excel file provided'}), 400
         
         excel_file = request.files['excel_file']
+        
+        try:
+            manifest = get_rename_manifest()
+        except ValueError as e:
+            return jsonify({'error': f'Invalid manifest: {e}'}), 400
+        if manifest is not None:
+            return rename_preview_manifest(excel_file, manifest)
+        
         files = request.files.getlist('docx_files')
         
         if not files:
             return jsonify({'error': 'No DOCX files provided'}), 400
         
-        # Create unique temp directories for this request
-        import uuid
-        unique_id = str(uuid.uuid4())[:8]
-        temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'excel_rename_temp_{unique_id}')
-        docx_dir = os.path.join(temp_dir, 'docx_files')
-        os.makedirs(docx_dir, exist_ok=True)
-        
-        # Save Excel file
-        excel_filename = secure_filename(excel_file.filename)
-        excel_path = os.path.join(temp_dir, excel_filename)
-        excel_file.save(excel_path)
+        # Keep the uploads in a server-side session until execute or expiry
+        session_id, session_dir = create_rename_session()
+        docx_dir = os.path.join(session_dir, 'docx_files')
         
-        # Save DOCX files
-        for file in files:
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(docx_dir, filename))
-        
-        # Generate preview
-        result = generate_rename_preview_from_excel(excel_path, docx_dir)
+        try:
+            # Save Excel file; only the preview needs it
+            excel_filename = secure_filename(excel_file.filename)
+            excel_path = os.path.join(session_dir, excel_filename)
+            excel_file.save(excel_path)
+            
+            # Save DOCX files
+            for file in files:
+                filename = secure_filename(file.filename)
+                file.save(os.path.join(docx_dir, filename))
+            
+            # Generate preview
+            result = generate_rename_preview_from_excel(excel_path, docx_dir)
+            cleanup_temp_files(excel_path)
+        except Exception:
+            cleanup_temp_files(session_dir)
+            raise
         
         # Check if error returned
         if isinstance(result, dict) and 'error' in result:
+            cleanup_temp_files(session_dir)
             return jsonify(result), 400
         
+        save_rename_session(session_dir, result)
         return jsonify({
             'preview': result['preview'],
             'excel_data': result['excel_data'],
-            'temp_dir': temp_dir
+            'duplicates': result['duplicates'],
+            'collisions': result['collisions'],
+            'session_id': session_id,
+            'expires_in': RENAME_SESSION_TTL
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def rename_preview_manifest(excel_file, manifest):
+    """Excel rename preview for a manifest: only the sheet is uploaded, nothing is kept"""
+    if not manifest:
+        return jsonify({'error': 'No DOCX files provided'}), 400
+    
+    import uuid
+    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], f'excel_rename_manifest_{str(uuid.uuid4())[:8]}_{secure_filename(excel_file.filename)}')
+    excel_file.save(excel_path)
+    try:
+        result = generate_rename_preview_from_excel(excel_path, None, list(manifest))
+    finally:
+        cleanup_temp_files(excel_path)
+    
+    if 'error' in result:
+        return jsonify(result), 400
+    
+    return jsonify({
+        'preview': with_manifest_metadata(result['preview'], manifest),
+        'excel_data': result['excel_data'],
+        'duplicates': result['duplicates'],
+        'collisions': result['collisions'],
+        'mode': 'manifest'
+    })
+
 # Route 4c: Excel Rename Execute
 @app.route('/api/rename-execute', methods=['POST'])
 def rename_execute():
@@ -652,42 +1157,30 @@ def rename_execute():
     if feature_check:
         return feature_check
     
-    zip_path = None
+    session_dir = None
     try:
-        data = request.get_json()
-        temp_dir = data.get('temp_dir')
-        preview_data = data.get('preview_data')
-        
-        if not temp_dir or not preview_data:
-            return jsonify({'error': 'Missing required parameters'}), 400
-        
-        # Find the Excel file and docx folder
-        excel_path = None
-        docx_dir = os.path.join(temp_dir, 'docx_files')
-        
-        for file in os.listdir(temp_dir):
-            if file.endswith(('.xlsx', '.xls')):
-                excel_path = os.path.join(temp_dir, file)
-                break
-        
-        if not excel_path:
-            return jsonify({'error': 'Excel file not found'}), 400
-        
-        # Execute rename
-        results = execute_rename_from_excel(excel_path, docx_dir, preview_data)
-        
-        # Create a ZIP file of renamed files
-        zip_path = docx_dir + '.zip'
-        shutil.make_archive(docx_dir, 'zip', docx_dir)
-        
-        return send_file(zip_path, as_attachment=True, download_name='renamed_files.zip')
+        data = request.get_json(silent=True) or {}
+        session_dir, session = load_rename_session(data.get('session_id'))
+        
+        if not session_dir:
+            return jsonify({'error': 'Rename session not found or expired'}), 404
+        
+        # Execute rename from the cached preview straight into the ZIP file of renamed files
+        docx_dir = os.path.join(session_dir, 'docx_files')
+        zip_path = os.path.join(session_dir, 'renamed_files.zip')
+        filenames = [item['original_name'] for item in session['preview']]
+        count, errors = execute_rename_from_excel(docx_dir, session['preview'], zip_path, filenames)
+        
+        # Files that could not be written are listed in rename_errors.json in the archive
+        response = send_file(zip_path, as_attachment=True, download_name='renamed_files.zip')
+        response.headers['X-Renamed-Count'] = str(count)
+        response.headers['X-Failed-Count'] = str(len(errors))
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        if 'temp_dir' in locals():
-            cleanup_temp_files(temp_dir)
-        if zip_path:
-            cleanup_temp_files(zip_path)
+        if session_dir:
+            cleanup_temp_files(session_dir)
 
 # Route 5: ICN Extractor
 @app.route('/api/extract-icn', methods=['POST'])
@@ -697,7 +1190,6 @@ def extract_icn():
         return feature_check
     
     temp_dir = None
-    output_dir = None
     zip_path = None
     try:
         files = request.files.getlist('files')
@@ -705,26 +1197,28 @@ def extract_icn():
         if not files:
             return jsonify({'error': 'No files provided'}), 400
         
+        layout = request.form.get('layout', 'dedup')
+        if layout not in ICN_LAYOUTS:
+            return jsonify({'error': f"layout must be one of {', '.join(ICN_LAYOUTS)}"}), 400
+        try:
+            image_options = get_image_options()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Create unique directories for this request
         import uuid
         unique_id = str(uuid.uuid4())[:8]
         temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_extract_{unique_id}')
         os.makedirs(temp_dir, exist_ok=True)
         
-        output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_output_{unique_id}')
-        os.makedirs(output_dir, exist_ok=True)
-        
         # Save uploaded files
         for file in files:
             filename = secure_filename(file.filename)
             file.save(os.path.join(temp_dir, filename))
         
-        # Extract ICNs
-        extract_icn_from_docx(temp_dir, output_dir)
-        
-        # Create a ZIP file
-        zip_path = output_dir + '.zip'
-        shutil.make_archive(output_dir, 'zip', output_dir)
+        # Extract ICNs straight into the ZIP file
+        zip_path = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_output_{unique_id}.zip')
+        extract_icn_from_docx(temp_dir, zip_path, layout, image_options)
         
         return send_file(zip_path, as_attachment=True, download_name='extracted_icn.zip')
     except Exception as e:
@@ -732,11 +1226,146 @@ def extract_icn():
     finally:
         if temp_dir:
             cleanup_temp_files(temp_dir)
-        if output_dir:
-            cleanup_temp_files(output_dir)
         if zip_path:
             cleanup_temp_files(zip_path)
 
+def get_icn_params():
+    """ICN Maker code parameters from the form"""
+    return {
+        'kpc': request.form.get('kpc', '1'),
+        'xyz': request.form.get('xyz', '1671Y'),
+        'sq_start': request.form.get('sq_start', '00005'),
+        'icv': request.form.get('icv', 'A'),
+        'issue': request.form.get('issue', '001'),
+        'sec': request.form.get('sec', '01')
+    }
+
+def get_image_options():
+    """
+    Image normalization options from the form, or None unless normalize_images is set.
+    Raises ValueError for invalid options or when Pillow is not installed.
+    """
+    if str(request.form.get('normalize_images', '')).lower() not in ('1', 'true', 'yes'):
+        return None
+    image_format = request.form.get('image_format', 'auto')
+    if image_format not in IMAGE_FORMAT_CHOICES:
+        raise ValueError(f"image_format must be one of {', '.join(IMAGE_FORMAT_CHOICES)}")
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ValueError('Pillow is not installed. Please install it with: pip install Pillow')
+    try:
+        max_dimension = int(request.form.get('max_dimension') or 2000)
+        thumbnail = int(request.form.get('thumbnail_size') or 0)
+        quality = int(request.form.get('image_quality') or 85)
+    except ValueError:
+        raise ValueError('max_dimension, thumbnail_size and image_quality must be whole numbers')
+    return {
+        'format': image_format,
+        'max_dimension': max_dimension if max_dimension > 0 else None,
+        'thumbnail': thumbnail if thumbnail > 0 else None,
+        'quality': min(95, max(1, quality)),
+    }
+
+def save_docx_uploads(files, input_dir):
+    """
+    Save uploaded documents into input_dir, suffixing names that collide after
+    secure_filename so none overwrites another. Returns the number of documents the
+    batch workers will see (see list_docx_files).
+    """
+    for file in files:
+        filename = secure_filename(file.filename)
+        stem, ext = os.path.splitext(filename)
+        suffix = 1
+        while os.path.exists(os.path.join(input_dir, filename)):
+            suffix += 1
+            filename = f'{stem}_{suffix}{ext}'
+        file.save(os.path.join(input_dir, filename))
+    return len(list_docx_files(input_dir))
+
+def stream_icn_documents(task, total_files, input_dir, unique_id, count_key, finish=None):
+    """
+    SSE generator over an ICN batch: task yields (filename, images, count, error) per
+    document as worker processes finish; count is reported under count_key. finish, if
+    given, runs before the completion event (e.g. to build the download archive).
+    """
+    import json as json_module
+
+    yield f"data: {json_module.dumps({'type': 'start', 'total': total_files})}\n\n"
+
+    converted_count = 0
+    failed_count = 0
+    images_total = 0
+    count_total = 0
+    completed = 0
+    try:
+        for filename, images, count, error in task:
+            completed += 1
+            if error is None:
+                converted_count += 1
+                images_total += images
+                count_total += count
+                yield f"data: {json_module.dumps({'type': 'progress', 'current': completed, 'total': total_files, 'filename': filename, 'images': images, count_key: count, 'status': 'completed'})}\n\n"
+            else:
+                failed_count += 1
+                yield f"data: {json_module.dumps({'type': 'progress', 'current': completed, 'total': total_files, 'filename': filename, 'status': 'failed', 'error': error})}\n\n"
+    except Exception as e:
+        app.logger.error(f"Error in ICN stream: {e}")
+        yield f"data: {json_module.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        return
+    finally:
+        cleanup_temp_files(input_dir)
+
+    if finish:
+        finish()
+    if converted_count > 0:
+        yield f"data: {json_module.dumps({'type': 'complete', 'converted': converted_count, 'failed': failed_count, 'total': total_files, 'images': images_total, count_key: count_total, 'download_id': unique_id})}\n\n"
+    else:
+        yield f"data: {json_module.dumps({'type': 'error', 'message': 'No documents were processed successfully'})}\n\n"
+
+# SSE endpoint for the ICN Extractor with per-document progress
+@app.route('/api/extract-icn/stream', methods=['POST'])
+def extract_icn_stream():
+    """Stream ICN extraction progress; documents are processed in parallel"""
+    feature_check = check_feature('icn_extractor')
+    if feature_check:
+        return feature_check
+
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    layout = request.form.get('layout', 'dedup')
+    if layout not in ICN_LAYOUTS:
+        return jsonify({'error': f"layout must be one of {', '.join(ICN_LAYOUTS)}"}), 400
+    try:
+        image_options = get_image_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    import uuid
+    unique_id = str(uuid.uuid4())[:8]
+    input_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_extract_{unique_id}')
+    os.makedirs(input_dir, exist_ok=True)
+    total_files = save_docx_uploads(files, input_dir)
+    if not total_files:
+        cleanup_temp_files(input_dir)
+        return jsonify({'error': 'No DOCX files provided'}), 400
+
+    zip_path = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_output_{unique_id}.zip')
+    task = iter_extract_icn(input_dir, zip_path, layout, image_options)
+    return sse_response(stream_icn_documents(task, total_files, input_dir, unique_id, 'labelled'))
+
+# Download endpoint for streamed ICN extraction
+@app.route('/api/extract-icn/download/<download_id>', methods=['GET'])
+def download_extract_icn(download_id):
+    """Download the extracted images after a streaming extraction"""
+    zip_path = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_output_{secure_filename(download_id)}.zip')
+
+    if os.path.exists(zip_path):
+        return send_file(zip_path, as_attachment=True, download_name='extracted_icn.zip')
+
+    return jsonify({'error': 'Download not found or expired'}), 404
+
 # Route 6: ICN Maker
 @app.route('/api/generate-icn', methods=['POST'])
 def generate_icn():
@@ -749,17 +1378,14 @@ def generate_icn():
     zip_path = None
     try:
         files = request.files.getlist('files')
-        params = {
-            'kpc': request.form.get('kpc', '1'),
-            'xyz': request.form.get('xyz', '1671Y'),
-            'sq_start': request.form.get('sq_start', '00005'),
-            'icv': request.form.get('icv', 'A'),
-            'issue': request.form.get('issue', '001'),
-            'sec': request.form.get('sec', '01')
-        }
+        params = get_icn_params()
         
         if not files:
             return jsonify({'error': 'No files provided'}), 400
+        try:
+            image_options = get_image_options()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Create unique directories for this request
         import uuid
@@ -775,14 +1401,20 @@ def generate_icn():
             filename = secure_filename(file.filename)
             file.save(os.path.join(temp_dir, filename))
         
-        # Generate ICNs
-        generate_icn_labels(temp_dir, output_dir, params)
+        # Generate ICNs; a document that cannot be labelled does not fail the others
+        done, failed = generate_icn_labels(temp_dir, output_dir, params, ICN_SEQUENCE_DB, image_options)
+        if not done:
+            return jsonify({'error': 'No documents were labelled', 'failed': [{'filename': n, 'error': e} for n, e in failed]}), 500
         
         # Create a ZIP file
         zip_path = output_dir + '.zip'
         shutil.make_archive(output_dir, 'zip', output_dir)
         
-        return send_file(zip_path, as_attachment=True, download_name='generated_icn.zip')
+        response = send_file(zip_path, as_attachment=True, download_name='generated_icn.zip')
+        response.headers['X-Converted-Count'] = str(done)
+        response.headers['X-Total-Count'] = str(done + len(failed))
+        response.headers['X-Failed-Count'] = str(len(failed))
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -793,29 +1425,156 @@ def generate_icn():
         if zip_path:
             cleanup_temp_files(zip_path)
 
+# SSE endpoint for the ICN Maker with per-document progress
+@app.route('/api/generate-icn/stream', methods=['POST'])
+def generate_icn_stream():
+    """Stream ICN labelling progress; documents are labelled in parallel"""
+    feature_check = check_feature('icn_maker')
+    if feature_check:
+        return feature_check
+
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    params = get_icn_params()
+    try:
+        image_options = get_image_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    import uuid
+    unique_id = str(uuid.uuid4())[:8]
+    input_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_generate_{unique_id}')
+    output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_generated_{unique_id}')
+    os.makedirs(input_dir, exist_ok=True)
+    total_files = save_docx_uploads(files, input_dir)
+    if not total_files:
+        cleanup_temp_files(input_dir)
+        return jsonify({'error': 'No DOCX files provided'}), 400
+
+    def archive_output():
+        if os.path.isdir(output_dir):
+            shutil.make_archive(output_dir, 'zip', output_dir)
+            cleanup_temp_files(output_dir)
+
+    task = iter_generate_icn_labels(input_dir, output_dir, params, ICN_SEQUENCE_DB, image_options)
+    return sse_response(stream_icn_documents(task, total_files, input_dir, unique_id, 'labels', archive_output))
+
+# Download endpoint for streamed ICN labelling
+@app.route('/api/generate-icn/download/<download_id>', methods=['GET'])
+def download_generate_icn(download_id):
+    """Download the labelled documents after a streaming run"""
+    zip_path = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_generated_{secure_filename(download_id)}.zip')
+
+    if os.path.exists(zip_path):
+        return send_file(zip_path, as_attachment=True, download_name='generated_icn.zip')
+
+    return jsonify({'error': 'Download not found or expired'}), 404
+
+# Next free ICN SQ number per prefix
+@app.route('/api/icn-sequences', methods=['GET'])
+def icn_sequences():
+    """List the next free SQ number per ICN prefix, optionally for one prefix only"""
+    feature_check = check_feature('icn_maker')
+    if feature_check:
+        return feature_check
+
+    try:
+        return jsonify({'sequences': list_icn_sequences(ICN_SEQUENCE_DB, request.args.get('prefix'))})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Route 7: ICN Validator
+ICN_CATALOG_PREFIX = 'icn_catalog_'
+ICN_CATALOG_DB = 'catalog.db'
+# Validation mode -> form field of the document files
+ICN_VALIDATION_MODES = {'adoc': 'adoc_files', 'xml': 'xml_files'}
+
+ICN_CATALOG_TTL = 7 * 24 * 60 * 60  # projects unused for a week are removed
+
+def icn_catalog_dir(project):
+    """Persistent directory of a named validation project, or None for an invalid name"""
+    if not isinstance(project, str) or not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', project):
+        return None
+    return os.path.join(app.config['UPLOAD_FOLDER'], f'{ICN_CATALOG_PREFIX}{project}')
+
+def expire_icn_catalogs():
+    """Remove validation projects not used within ICN_CATALOG_TTL"""
+    import time
+    now = time.time()
+    for entry in os.listdir(app.config['UPLOAD_FOLDER']):
+        if not entry.startswith(ICN_CATALOG_PREFIX):
+            continue
+        project_dir = os.path.join(app.config['UPLOAD_FOLDER'], entry)
+        db_path = os.path.join(project_dir, ICN_CATALOG_DB)
+        try:
+            last_used = os.path.getmtime(db_path if os.path.exists(db_path) else project_dir)
+        except OSError:
+            continue
+        if now - last_used > ICN_CATALOG_TTL:
+            cleanup_temp_files(project_dir)
+
+def project_image_path(images_dir, filename, dm=None):
+    """
+    Where a project image goes: images/<dm>/<path>, the DM folder being the dm field or
+    else the first folder of filename (e.g. 'DMC-X/ICN-1.png'). Every path component is
+    sanitised; returns None when there is no DM folder or no file name.
+    """
+    parts = [secure_filename(part) for part in filename.replace('\\', '/').split('/')]
+    parts = [part for part in parts if part]
+    if dm:
+        parts = [secure_filename(dm)] + parts
+    if len(parts) < 2 or not parts[0]:
+        return None
+    return os.path.join(images_dir, *parts)
+
 @app.route('/api/validate-icn', methods=['POST'])
 def validate_icn():
+    """
+    Validate ADOC image references, or with mode=xml the ICN references of S1000D data
+    modules (uploaded as xml_files). With a 'project' name ADOC files are kept between
+    calls and indexed in a catalog, so later calls only need to upload what changed
+    (and list deleted files under 'remove'). Project images keep their DM folder: send
+    them named '<dm>/<file>' or give the folder in a 'dm' field.
+    """
     feature_check = check_feature('icn_validator')
     if feature_check:
         return feature_check
     
     temp_dir = None
     try:
-        adoc_files = request.files.getlist('adoc_files')
+        mode = request.form.get('mode', 'adoc')
+        if mode not in ICN_VALIDATION_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(ICN_VALIDATION_MODES)}"}), 400
+        adoc_files = request.files.getlist(ICN_VALIDATION_MODES[mode])
         image_files = request.files.getlist('image_files')
-        
-        if not adoc_files:
-            return jsonify({'error': 'No ADOC files provided'}), 400
-        
-        # Create unique directories for this request
-        import uuid
-        unique_id = str(uuid.uuid4())[:8]
-        temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_validate_{unique_id}')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        adoc_dir = os.path.join(temp_dir, 'adoc')
-        images_dir = os.path.join(temp_dir, 'images')
+        project = request.form.get('project')
+        
+        if project is not None:
+            project_dir = icn_catalog_dir(project)
+            if not project_dir:
+                return jsonify({'error': 'Invalid project name'}), 400
+            if mode != 'adoc':
+                return jsonify({'error': 'Projects are only supported for ADOC validation'}), 400
+        elif not adoc_files:
+            return jsonify({'error': f'No {mode.upper()} files provided'}), 400
+        
+        if project is not None:
+            expire_icn_catalogs()
+            adoc_dir = os.path.join(project_dir, 'adoc')
+            images_dir = os.path.join(project_dir, 'images')
+            image_paths = [project_image_path(images_dir, file.filename, request.form.get('dm')) for file in image_files]
+            if None in image_paths:
+                return jsonify({'error': "Project images need a DM folder: name them '<dm>/<file>' or send a 'dm' field"}), 400
+        else:
+            # Create unique directories for this request
+            import uuid
+            unique_id = str(uuid.uuid4())[:8]
+            temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_validate_{unique_id}')
+            os.makedirs(temp_dir, exist_ok=True)
+            
+            adoc_dir = os.path.join(temp_dir, 'adoc')
+            images_dir = os.path.join(temp_dir, 'images')
         os.makedirs(adoc_dir, exist_ok=True)
         os.makedirs(images_dir, exist_ok=True)
         
@@ -824,20 +1583,127 @@ def validate_icn():
             filename = secure_filename(file.filename)
             file.save(os.path.join(adoc_dir, filename))
         
-        for file in image_files:
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(images_dir, filename))
-        
-        # Validate ICNs
-        results = validate_adoc_images(adoc_dir, images_dir)
+        if project is None:
+            for file in image_files:
+                filename = secure_filename(file.filename)
+                file.save(os.path.join(images_dir, filename))
+            
+            # Validate ICNs
+            validate = validate_dm_images if mode == 'xml' else validate_adoc_images
+            results = validate(adoc_dir, images_dir)
+            return jsonify(results)
+        
+        for file, path in zip(image_files, image_paths):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file.save(path)
+        
+        # 'remove' takes ADOC file names and '<dm>/<file>' image paths
+        for name in request.form.getlist('remove'):
+            path = project_image_path(images_dir, name) or os.path.join(adoc_dir, secure_filename(name))
+            if os.path.isfile(path):
+                os.remove(path)
         
-        return jsonify(results)
+        db_path = os.path.join(project_dir, ICN_CATALOG_DB)
+        sync_icn_catalog(db_path, adoc_dir, images_dir)
+        os.utime(db_path)  # last use, for expire_icn_catalogs
+        return jsonify(validate_icn_catalog(db_path))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
         if temp_dir:
             cleanup_temp_files(temp_dir)
 
+def stream_icn_validation(results, total_files, temp_dir, summary=None):
+    """
+    SSE generator over validation results: one event per document as workers finish.
+    summary, if given, returns extra fields for the completion event.
+    """
+    import json as json_module
+
+    yield f"data: {json_module.dumps({'type': 'start', 'total': total_files})}\n\n"
+
+    counts = {'ok': 0, 'warning': 0, 'error': 0}
+    completed = 0
+    try:
+        for result in results:
+            completed += 1
+            counts[result.get('status', 'error')] += 1
+            yield f"data: {json_module.dumps({'type': 'progress', 'current': completed, 'total': total_files, **result})}\n\n"
+    except Exception as e:
+        app.logger.error(f"Error in ICN validation stream: {e}")
+        yield f"data: {json_module.dumps({'type': 'error', 'error': str(e)})}\n\n"
+    finally:
+        extra = summary() if summary else {}
+        cleanup_temp_files(temp_dir)
+
+    yield f"data: {json_module.dumps({'type': 'complete', 'total': completed, **counts, **extra})}\n\n"
+
+# SSE endpoint for the ICN Validator with per-DM results
+@app.route('/api/validate-icn/stream', methods=['POST'])
+def validate_icn_stream():
+    """
+    Stream validation results per ADOC file, or per data module with mode=xml; files are
+    checked in parallel. In XML mode the completion event lists 'unreferenced' images.
+    """
+    feature_check = check_feature('icn_validator')
+    if feature_check:
+        return feature_check
+
+    mode = request.form.get('mode', 'adoc')
+    if mode not in ICN_VALIDATION_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(ICN_VALIDATION_MODES)}"}), 400
+    adoc_files = request.files.getlist(ICN_VALIDATION_MODES[mode])
+    image_files = request.files.getlist('image_files')
+    if not adoc_files:
+        return jsonify({'error': f'No {mode.upper()} files provided'}), 400
+
+    import uuid
+    unique_id = str(uuid.uuid4())[:8]
+    temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'icn_validate_{unique_id}')
+    adoc_dir = os.path.join(temp_dir, 'adoc')
+    images_dir = os.path.join(temp_dir, 'images')
+    os.makedirs(adoc_dir, exist_ok=True)
+    os.makedirs(images_dir, exist_ok=True)
+    for file in adoc_files:
+        file.save(os.path.join(adoc_dir, secure_filename(file.filename)))
+    for file in image_files:
+        file.save(os.path.join(images_dir, secure_filename(file.filename)))
+
+    if mode == 'xml':
+        total_files = sum(1 for f in os.listdir(adoc_dir) if f.lower().endswith('.xml'))
+        referenced = set()
+        results = iter_validate_dm_images(adoc_dir, images_dir, referenced)
+
+        def summary():
+            return {'unreferenced': sorted(list_icn_images(images_dir) - referenced)}
+    else:
+        total_files = sum(1 for f in os.listdir(adoc_dir) if f.endswith('.adoc'))
+        results = iter_validate_adoc_images(adoc_dir, images_dir)
+        summary = None
+    return sse_response(stream_icn_validation(results, total_files, temp_dir, summary))
+
+# Re-validate a project from its catalog without uploading anything, or delete it
+@app.route('/api/validate-icn/catalog/<project>', methods=['GET', 'DELETE'])
+def validate_icn_project(project):
+    """Validation results of a project straight from its catalog; DELETE removes the project"""
+    feature_check = check_feature('icn_validator')
+    if feature_check:
+        return feature_check
+
+    project_dir = icn_catalog_dir(project)
+    db_path = os.path.join(project_dir, ICN_CATALOG_DB) if project_dir else None
+    if not db_path or not os.path.exists(db_path):
+        return jsonify({'error': 'Project not found'}), 404
+
+    try:
+        if request.method == 'DELETE':
+            cleanup_temp_files(project_dir)
+            return jsonify({'deleted': project})
+        os.utime(db_path)
+        return jsonify(validate_icn_catalog(db_path))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Route 8: AsciiDoc to S1000D XML Converter (Batch Support)
 @app.route('/api/convert/adoc-to-s1000d', methods=['POST'])
 def adoc_to_s1000d():
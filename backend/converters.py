@@ -6,17 +6,33 @@ adapted from the original Python scripts.
 import os
 import re
 import subprocess
-import shutil
+import io
+import copy
+import json
+import hashlib
+import posixpath
+import string
+import threading
+import weakref
+import traceback
 import zipfile
-import xml.etree.ElementTree as ET
 from pathlib import Path
+from collections import OrderedDict
+from itertools import accumulate
+from bisect import bisect_right
+from lxml import etree
 from docx import Document
+from docx.document import Document as DocumentObject
+from docx.image.image import Image
+from docx.oxml.shape import CT_Inline
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.styles import BabelFish
 from docx.text.paragraph import Paragraph
 from docx.table import Table
 from docx.oxml.ns import qn
 from docx.shared import Inches
 from pdf2docx import Converter
-import tempfile
+import numpy as np
 import pandas as pd
 
 # ============================================================================
@@ -271,6 +287,8 @@ NSMAP = {
     "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
     "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
     "wp": "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing",
+    "v": "urn:schemas-microsoft-com:vml",
+    "mc": "http://schemas.openxmlformats.org/markup-compatibility/2006",
 }
 
 def iter_block_items(parent):
@@ -288,6 +306,88 @@ def iter_block_items(parent):
         elif child.tag == qn("w:tbl"):
             yield Table(child, parent)
 
+def file_sha1(path):
+    """Return the SHA-1 hex digest of a file, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def docx_block_styles(doc):
+    """
+    Style name of every body block of a python-docx Document, in iter_block_items order
+    (None for tables), as Paragraph.style.name reports it. Style ids are resolved from
+    the styles part once rather than through Paragraph.style for every paragraph.
+    """
+    style_names = {}
+    default_style = "Normal"
+    for style in doc.styles.element.iter(qn("w:style")):
+        if style.get(qn("w:type")) != "paragraph":
+            continue
+        name_el = style.find(qn("w:name"))
+        name = name_el.get(qn("w:val")) if name_el is not None else style.get(qn("w:styleId"))
+        name = BabelFish.internal2ui(name)
+        style_names[style.get(qn("w:styleId"))] = name
+        if style.get(qn("w:default")) in ("1", "true"):
+            default_style = name
+
+    block_styles = []
+    p_tag, tbl_tag = qn("w:p"), qn("w:tbl")
+    style_path = f"{qn('w:pPr')}/{qn('w:pStyle')}"
+    for child in doc.element.body.iterchildren():
+        if child.tag == p_tag:
+            pStyle = child.find(style_path)
+            style_id = pStyle.get(qn("w:val")) if pStyle is not None else None
+            block_styles.append(style_names.get(style_id, default_style) if style_id else default_style)
+        elif child.tag == tbl_tag:
+            block_styles.append(None)
+    return block_styles
+
+def build_section_template(doc):
+    """
+    Build the per-job template for split output documents: python-docx's default package
+    with the source document's styles.xml, numbering.xml, theme and final sectPr swapped
+    in. Returns the package bytes; each section is then opened from memory with
+    Document(io.BytesIO(template)) instead of reparsing the default template and
+    patching page setup by hand.
+    """
+    replacements = {}
+    for reltype, partname in (
+        (RT.STYLES, "word/styles.xml"),
+        (RT.NUMBERING, "word/numbering.xml"),
+        (RT.THEME, "word/theme/theme1.xml"),
+    ):
+        try:
+            replacements[partname] = doc.part.part_related_by(reltype).blob
+        except KeyError:
+            continue
+
+    default_template = io.BytesIO()
+    Document().save(default_template)
+    with zipfile.ZipFile(default_template, "r") as default_pkg:
+        document_xml = etree.fromstring(default_pkg.read("word/document.xml"))
+        body = document_xml.find(qn("w:body"))
+        source_sectPr = doc.element.body.find(qn("w:sectPr"))
+        if source_sectPr is not None:
+            sectPr = copy.deepcopy(source_sectPr)
+            # Header/footer parts are not carried over, so drop their relationship ids
+            for ref in sectPr.findall(qn("w:headerReference")) + sectPr.findall(qn("w:footerReference")):
+                sectPr.remove(ref)
+            for old in body.findall(qn("w:sectPr")):
+                body.remove(old)
+            body.append(sectPr)
+        replacements["word/document.xml"] = etree.tostring(
+            document_xml, xml_declaration=True, encoding="UTF-8", standalone=True
+        )
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as template:
+            for item in default_pkg.infolist():
+                data = replacements.get(item.filename)
+                template.writestr(item.filename, data if data is not None else default_pkg.read(item.filename))
+    return buffer.getvalue()
+
 def copy_numbering(source_para, target_para):
     """
     Copies numbering (w:numPr) from source paragraph to target paragraph safely.
@@ -344,10 +444,52 @@ def safe_set_run_font(target_run, source_run):
     except Exception:
         traceback.print_exc()
 
-def copy_paragraph(source_para, target_container, temp_img_dir):
+def new_image_cache():
+    """
+    Job-scoped image cache for the splitter. Each source image part is hashed once,
+    identical blobs under different rIds share one parsed Image, and target packages
+    reuse the image part already attached for a given hash.
+    """
+    return {
+        "by_part": {},   # source partname -> sha1
+        "by_hash": {},   # sha1 -> docx Image
+        "attached": weakref.WeakKeyDictionary(),  # target package -> {sha1: ImagePart}
+    }
+
+def cached_image(image_part, image_cache):
+    """Return the docx Image for a source image part, reading and hashing its blob once per job."""
+    partname = str(image_part.partname)
+    sha1 = image_cache["by_part"].get(partname)
+    if sha1 is None:
+        blob = image_part.blob
+        sha1 = hashlib.sha1(blob).hexdigest()
+        image_cache["by_part"][partname] = sha1
+        if sha1 not in image_cache["by_hash"]:
+            image_cache["by_hash"][sha1] = Image.from_blob(blob)
+    return image_cache["by_hash"][sha1]
+
+def add_cached_picture(run, image, image_cache, width):
+    """
+    Add an inline picture for an in-memory Image to run, attaching its image part to the
+    target package at most once. Equivalent to run.add_picture() without re-reading and
+    rehashing the blob on every call.
+    """
+    part = run.part
+    package = part.package
+    attached = image_cache["attached"].setdefault(package, {})
+    image_part = attached.get(image.sha1)
+    if image_part is None:
+        image_part = package.get_or_add_image_part(io.BytesIO(image.blob))
+        attached[image.sha1] = image_part
+    rId = part.relate_to(image_part, RT.IMAGE)
+    cx, cy = image.scaled_dimensions(width, None)
+    inline = CT_Inline.new_pic_inline(part.next_id, rId, image.filename, cx, cy)
+    run._r.add_drawing(inline)
+
+def copy_paragraph(source_para, target_container, image_cache):
     """
     Copy paragraph text, formatting and images from source_para into target_container
-    (which can be a Document or a _Cell).
+    (which can be a Document or a _Cell). Images go through image_cache (see new_image_cache).
     """
     try:
         has_drawings = bool(source_para._p.findall(".//w:drawing", namespaces=NSMAP))
@@ -360,9 +502,11 @@ def copy_paragraph(source_para, target_container, temp_img_dir):
 
     target_para = target_container.add_paragraph()
 
+    # The section template carries the source styles, so the style id is copied as-is
     try:
-        if getattr(source_para, "style", None):
-            target_para.style = source_para.style
+        style_id = source_para._p.style
+        if style_id:
+            target_para._p.style = style_id
     except Exception:
         pass
 
@@ -410,29 +554,7 @@ def copy_paragraph(source_para, target_container, temp_img_dir):
                         continue
 
                     try:
-                        image_bytes = image_part.blob
-                    except Exception:
-                        continue
-
-                    extension = "png"
-                    try:
-                        if hasattr(image_part, "ext") and image_part.ext:
-                            extension = image_part.ext
-                        else:
-                            ext_candidate = getattr(image_part, "content_type", "")
-                            if "/" in ext_candidate:
-                                extension = ext_candidate.split("/")[-1]
-                    except Exception:
-                        pass
-                    if extension == "jpeg":
-                        extension = "jpg"
-
-                    img_filename = f"{rId}.{extension}"
-                    img_path = os.path.join(temp_img_dir, img_filename)
-                    try:
-                        if not os.path.exists(img_path):
-                            with open(img_path, "wb") as f:
-                                f.write(image_bytes)
+                        image = cached_image(image_part, image_cache)
                     except Exception:
                         continue
 
@@ -447,42 +569,35 @@ def copy_paragraph(source_para, target_container, temp_img_dir):
                         pass
 
                     try:
-                        pic_run = target_para.add_run()
-                        pic_run.add_picture(img_path, width=width)
+                        add_cached_picture(target_para.add_run(), image, image_cache, width)
                     except Exception:
-                        try:
-                            container_doc = (
-                                target_container
-                                if isinstance(target_container, Document)
-                                else target_container.part.package
-                            )
-                        except Exception:
-                            container_doc = None
                         continue
             except Exception:
                 traceback.print_exc()
                 continue
 
-def copy_table(source_table, target_container, temp_img_dir):
+def copy_table(source_table, target_container, image_cache):
     """
     Copy table structure and content from source_table into target_container (Document or _Cell).
     Handles nested tables by rendering them as paragraphs inside the target cell.
     """
     try:
-        if isinstance(target_container, type(Document())):
+        if isinstance(target_container, DocumentObject):
             target_table = target_container.add_table(rows=0, cols=len(source_table.columns))
         else:
             for source_row in source_table.rows:
                 for source_cell in source_row.cells:
                     for block in iter_block_items(source_cell):
                         if isinstance(block, Paragraph):
-                            copy_paragraph(block, target_container, temp_img_dir)
+                            copy_paragraph(block, target_container, image_cache)
                         elif isinstance(block, Table):
-                            copy_table(block, target_container, temp_img_dir)
+                            copy_table(block, target_container, image_cache)
             return
 
         try:
-            target_table.style = source_table.style
+            style_id = source_table._tbl.tblStyle_val
+            if style_id:
+                target_table._tbl.tblStyle_val = style_id
         except Exception:
             pass
         try:
@@ -505,309 +620,1089 @@ def copy_table(source_table, target_container, temp_img_dir):
 
                 for block in iter_block_items(source_cell):
                     if isinstance(block, Paragraph):
-                        copy_paragraph(block, target_cell, temp_img_dir)
+                        copy_paragraph(block, target_cell, image_cache)
                     elif isinstance(block, Table):
-                        copy_table(block, target_cell, temp_img_dir)
+                        copy_table(block, target_cell, image_cache)
     except Exception:
         traceback.print_exc()
 
-def split_docx_by_heading_v2(input_path, output_dir, heading_style='Heading 1'):
+def heading_style_levels(heading_style):
+    """
+    Normalize a heading style argument into an ordered list of style names, outermost
+    level first. Accepts a single style name or a list such as ['Heading 1', 'Heading 2'].
+    """
+    if isinstance(heading_style, str):
+        return [heading_style]
+    levels = [s for s in (heading_style or []) if s]
+    return levels or ['Heading 1']
+
+def block_heading_levels(blocks, heading_styles, block_styles=None):
+    """
+    Single scan over the blocks: returns a list holding, for each block, the index of its
+    style in heading_styles, or None when the block is not one of the requested headings.
+    block_styles, the per-block style names of docx_block_styles, avoids resolving every
+    paragraph style through python-docx.
+    """
+    level_of = {name: depth for depth, name in enumerate(heading_styles)}
+    if block_styles is not None and len(block_styles) == len(blocks):
+        return [level_of.get(name) for name in block_styles]
+
+    levels = []
+    for block in blocks:
+        level = None
+        if isinstance(block, Paragraph):
+            try:
+                style = block.style
+                if style is not None:
+                    level = level_of.get(getattr(style, "name", None))
+            except Exception:
+                level = None
+        levels.append(level)
+    return levels
+
+def plan_heading_sections(levels, start, end, depth=0):
+    """
+    Partition blocks[start:end] on headings of the given depth. Returns a list of
+    (start, end, children) tuples where children is the nested plan for the next heading
+    level, or None when the section is written as a single document.
+    Content before the first heading becomes its own leading section.
+    """
+    bounds = [i for i in range(start, end) if levels[i] == depth]
+    if not bounds or bounds[0] != start:
+        bounds.insert(0, start)
+    bounds.append(end)
+
+    sections = []
+    for s, e in zip(bounds, bounds[1:]):
+        children = None
+        if any(levels[i] == depth + 1 for i in range(s, e)):
+            children = plan_heading_sections(levels, s, e, depth + 1)
+        sections.append((s, e, children))
+    return sections
+
+def heading_titles(blocks, levels):
+    """Text of every heading block, by block index, for iter_planned_sections."""
+    return {i: blocks[i].text for i, level in enumerate(levels) if level is not None}
+
+def iter_planned_sections(titles, levels, plan, output_dir, intro_title=None, depth=0, rename=None):
+    """
+    Walk a section plan and yield (out_path, start, end) for every document to write.
+    titles maps each heading block index to its text (see heading_titles).
+    Sections with children become folders named after their heading, so a
+    ['Heading 1', 'Heading 2'] split produces chapter/section.docx.
+    rename, as returned by section_renamer, may replace a document's file name.
+    """
+    for i, (start, end, children) in enumerate(plan):
+        if levels[start] is not None and levels[start] <= depth:
+            title = titles[start].strip()
+        else:
+            title = intro_title or f"Section_{i+1}"
+        if not title:
+            title = f"Section_{i+1}"
+
+        safe_title = "".join(c for c in title if c.isalnum() or c in " _-").strip()[:50]
+        if not safe_title:
+            safe_title = f"Section_{i+1}"
+
+        if children is None:
+            stem = f"{i+1:02d}_{safe_title}"
+            if rename:
+                stem = rename(title, stem, output_dir) or stem
+            yield os.path.join(output_dir, f"{stem}.docx"), start, end
+        else:
+            section_dir = os.path.join(output_dir, f"{i+1:02d}_{safe_title}")
+            os.makedirs(section_dir, exist_ok=True)
+            yield from iter_planned_sections(titles, levels, children, section_dir, intro_title, depth + 1, rename)
+
+RENAME_REPORT_NAME = "rename_report.json"
+
+def section_renamer(rename_mapping, output_dir):
+    """
+    Naming hook for a fused split-and-rename. rename_mapping is the Doc Name -> DMC Code
+    mapping of load_excel_mapping. Returns (rename, report): rename(title, stem, directory)
+    gives the DMC-based file stem for a section whose heading title (or default file stem)
+    matches the sheet, or None; report collects matched and unmatched sections.
+    """
+    index = build_mapping_index(rename_mapping)
+    report = {'matched': [], 'unmatched': [], 'collisions': index['collisions']}
+    used = set()
+
+    def rename(title, stem, directory):
+        folder = os.path.relpath(directory, output_dir).replace(os.path.sep, '/')
+        folder = '' if folder == '.' else folder
+        key = find_mapping_key(title, index) or find_mapping_key(stem, index)
+        if key is None:
+            used.add((folder, stem.lower()))
+            report['unmatched'].append({'section': title, 'folder': folder, 'file': f"{stem}.docx"})
+            return None
+
+        dmc_code = rename_mapping[key]
+        base = dmc_filename_stem(dmc_code) or stem
+        candidate, i = base, 1
+        while (folder, candidate.lower()) in used:
+            candidate = f"{base}_{i}"
+            i += 1
+        used.add((folder, candidate.lower()))
+        report['matched'].append({
+            'section': title,
+            'folder': folder,
+            'file': f"{candidate}.docx",
+            'dmc_code': dmc_code,
+            'matched_excel_key': key
+        })
+        return candidate
+
+    return rename, report
+
+def write_rename_report(report, output_dir):
+    """Write the fused split-and-rename report as rename_report.json in output_dir."""
+    with open(os.path.join(output_dir, RENAME_REPORT_NAME), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+def split_docx_by_heading_v2(input_path, output_dir, heading_style='Heading 1', progress_callback=None, rename_mapping=None):
     """
     Enhanced version: Split a DOCX file into multiple files based on heading style.
     Advanced handling of images, tables (including nested), numbering, and formatting.
+    heading_style may be a list of styles (outermost first) to produce a nested folder tree
+    from a single parse. Returns number of output files.
+
+    progress_callback, if given, is called as progress_callback(current, total, out_path):
+    once with current=0 when the sections are known, then after each section is written.
+
+    rename_mapping (see load_excel_mapping) names each section after the DMC code whose
+    Doc Name matches its heading title; a rename_report.json lists unmatched sections.
     """
     os.makedirs(output_dir, exist_ok=True)
-    temp_img_dir = os.path.join(output_dir, "temp_images")
-    os.makedirs(temp_img_dir, exist_ok=True)
+    image_cache = new_image_cache()
 
-    try:
-        doc = Document(input_path)
-        blocks = list(iter_block_items(doc))
+    doc = Document(input_path)
+    blocks = list(iter_block_items(doc))
 
-        if not blocks:
-            return 0
+    if not blocks:
+        return 0
 
-        # Determine first heading
-        first = blocks[0]
-        first_is_heading = (
-            isinstance(first, Paragraph)
-            and first.style is not None
-            and getattr(first.style, "name", None) == heading_style
-        )
+    levels = block_heading_levels(blocks, heading_style_levels(heading_style), docx_block_styles(doc))
+    plan = plan_heading_sections(levels, 0, len(blocks))
+    rename, report = section_renamer(rename_mapping, output_dir) if rename_mapping is not None else (None, None)
+    sections = list(iter_planned_sections(heading_titles(blocks, levels), levels, plan, output_dir, rename=rename))
+    template = build_section_template(doc)
+    if progress_callback:
+        progress_callback(0, len(sections), None)
 
-        section_indices = []
-        if not first_is_heading:
-            section_indices.append(0)
+    # Generate outputs
+    total = 0
+    for out_path, start, end in sections:
+        section_blocks = blocks[start:end]
 
-        # Identify sections
-        for i, block in enumerate(blocks):
-            if (
-                isinstance(block, Paragraph)
-                and block.style is not None
-                and getattr(block.style, "name", None) == heading_style
-            ):
-                section_indices.append(i)
+        # Styles, numbering, theme and page setup come from the job template
+        new_doc = Document(io.BytesIO(template))
 
-        section_indices.append(len(blocks))
-        total = len(section_indices) - 1
+        # Copy blocks
+        for block in section_blocks:
+            if isinstance(block, Paragraph):
+                copy_paragraph(block, new_doc, image_cache)
+            elif isinstance(block, Table):
+                copy_table(block, new_doc, image_cache)
 
-        if total <= 0:
-            return 0
+        try:
+            new_doc.save(out_path)
+            total += 1
+        except Exception:
+            traceback.print_exc()
+            continue
 
-        # Generate outputs
-        for i in range(total):
-            start, end = section_indices[i], section_indices[i + 1]
-            section_blocks = blocks[start:end]
+        if progress_callback:
+            progress_callback(total, len(sections), out_path)
 
-            fb = section_blocks[0]
-            if isinstance(fb, Paragraph) and fb.style and fb.style.name == heading_style:
-                title = fb.text.strip() or f"Section_{i+1}"
-            else:
-                title = f"Section_{i+1}"
+    if report is not None:
+        write_rename_report(report, output_dir)
+    return total
 
-            safe_title = "".join(c for c in title if c.isalnum() or c in " _-").strip()[:50] or f"Section_{i+1}"
+def split_docx_by_heading(input_path, output_dir, heading_style='Heading 1', progress_callback=None, rename_mapping=None):
+    """
+    Splits the provided docx file into multiple docx files based on paragraphs that have
+    the specified heading_style (e.g., 'Heading 1'). A list of styles such as
+    ['Heading 1', 'Heading 2'] splits every level in one pass into a nested folder tree.
+    Returns number of output files. progress_callback and rename_mapping behave as in
+    split_docx_by_heading_v2.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    image_cache = new_image_cache()
+
+    doc = Document(input_path)
+    blocks = list(iter_block_items(doc))
+    if not blocks:
+        return 0
+
+    levels = block_heading_levels(blocks, heading_style_levels(heading_style), docx_block_styles(doc))
+    plan = plan_heading_sections(levels, 0, len(blocks))
+
+    rename, report = section_renamer(rename_mapping, output_dir) if rename_mapping is not None else (None, None)
+    sections = list(iter_planned_sections(heading_titles(blocks, levels), levels, plan, output_dir, "Introduction", rename=rename))
+    template = build_section_template(doc)
+    if progress_callback:
+        progress_callback(0, len(sections), None)
+
+    total_sections = 0
+    for out_path, start, end in sections:
+        section_blocks = blocks[start:end]
+        if not section_blocks:
+            continue
 
-            new_doc = Document()
+        # Create new document from the job template (source styles, numbering and page setup)
+        current_doc = Document(io.BytesIO(template))
 
-            # Copy page setup
+        # Copy blocks (paragraphs & tables) for this section
+        for block in section_blocks:
             try:
-                s1 = doc.sections[0]
-                s2 = new_doc.sections[-1]
-                s2.page_width = s1.page_width
-                s2.page_height = s1.page_height
-                s2.left_margin = s1.left_margin
-                s2.right_margin = s1.right_margin
-                s2.top_margin = s1.top_margin
-                s2.bottom_margin = s1.bottom_margin
-            except Exception:
-                pass
-
-            # Copy blocks
-            for block in section_blocks:
                 if isinstance(block, Paragraph):
-                    copy_paragraph(block, new_doc, temp_img_dir)
+                    copy_paragraph(block, current_doc, image_cache)
                 elif isinstance(block, Table):
-                    copy_table(block, new_doc, temp_img_dir)
-
-            out_path = os.path.join(output_dir, f"{i+1:02d}_{safe_title}.docx")
-
-            try:
-                new_doc.save(out_path)
+                    copy_table(block, current_doc, image_cache)
             except Exception:
                 traceback.print_exc()
+                continue
 
-        return total
-
-    finally:
         try:
-            shutil.rmtree(temp_img_dir)
+            current_doc.save(out_path)
+            total_sections += 1
         except Exception:
-            pass
+            traceback.print_exc()
+            continue
 
-def split_docx_by_heading(input_path, output_dir, heading_style='Heading 1'):
-    """
-    Splits the provided docx file into multiple docx files based on paragraphs that have
-    the specified heading_style (e.g., 'Heading 1'). Returns number of output files.
-    """
-    os.makedirs(output_dir, exist_ok=True)
-    temp_img_dir = os.path.join(output_dir, "temp_images")
-    os.makedirs(temp_img_dir, exist_ok=True)
+        if progress_callback:
+            progress_callback(total_sections, len(sections), out_path)
 
-    try:
-        doc = Document(input_path)
-        blocks = list(iter_block_items(doc))
-        if not blocks:
-            return 0
+    if report is not None:
+        write_rename_report(report, output_dir)
+    return total_sections
 
-        # Determine if the very first block is a heading of desired style safely
-        first_block = blocks[0]
-        first_is_heading = (
-            isinstance(first_block, Paragraph)
-            and getattr(first_block, "style", None) is not None
-            and getattr(first_block.style, "name", None) == heading_style
-        )
+# Document relationships that belong to body content; they are only carried into a
+# streamed section when the section's XML references their rId.
+BODY_RELTYPES = {
+    "image", "hyperlink", "oleObject", "package", "chart", "diagramData", "diagramLayout",
+    "diagramQuickStyle", "diagramColors", "diagramDrawing", "video", "audio", "media",
+    "control", "subDocument", "aFChunk", "header", "footer",
+}
 
-        section_indices = []
-        if not first_is_heading:
-            section_indices.append(0)
-
-        for i, block in enumerate(blocks):
-            if (
-                isinstance(block, Paragraph)
-                and getattr(block, "style", None) is not None
-                and getattr(block.style, "name", None) == heading_style
-            ):
-                section_indices.append(i)
-
-        section_indices.append(len(blocks))
-        total_sections = len(section_indices) - 1
-        if total_sections <= 0:
-            return 0
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
 
-        for i in range(total_sections):
-            start, end = section_indices[i], section_indices[i + 1]
-            section_blocks = blocks[start:end]
-            if not section_blocks:
-                continue
+def rels_path_for(partname):
+    """Return the zip name of the .rels file belonging to partname ('' for the package)."""
+    directory, name = posixpath.split(partname)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
 
-            first_block = section_blocks[0]
-            if (
-                isinstance(first_block, Paragraph)
-                and getattr(first_block, "style", None) is not None
-                and getattr(first_block.style, "name", None) == heading_style
-            ):
-                title = first_block.text.strip()
+def read_part_rels(zf, partname):
+    """Parse the relationships of partname as a list of (rId, type, target_partname or None, raw_target)."""
+    rels_name = rels_path_for(partname)
+    try:
+        root = etree.fromstring(zf.read(rels_name))
+    except KeyError:
+        return []
+    base_dir = posixpath.dirname(partname)
+    rels = []
+    for rel in root.iter(f"{{{RELS_NS}}}Relationship"):
+        target = rel.get("Target", "")
+        internal_target = None
+        if rel.get("TargetMode") != "External":
+            if target.startswith("/"):
+                internal_target = target.lstrip("/")
             else:
-                title = "Introduction"
+                internal_target = posixpath.normpath(posixpath.join(base_dir, target))
+        rels.append((rel.get("Id"), rel.get("Type", ""), internal_target, rel))
+    return rels
 
-            if not title:
-                title = f"Section_{i+1}"
+def read_final_sectPr(zf, partname, nsmap):
+    """
+    Return the body-level w:sectPr of a document part without parsing the whole part:
+    the decompressed stream is scanned once keeping only a bounded tail, and the final
+    sectPr is cut out of that tail. Returns None when it cannot be located.
+    """
+    tail = b""
+    with zf.open(partname) as stream:
+        for chunk in iter(lambda: stream.read(1 << 20), b""):
+            tail = (tail + chunk)[-(1 << 18):]
 
-            # Create new document and copy page settings
-            current_doc = Document()
+    end = tail.rfind(b"</w:sectPr>")
+    if end < 0:
+        return None
+    end += len(b"</w:sectPr>")
+
+    # Walk back to the matching start tag; a w:sectPrChange may nest another sectPr
+    tags = [(m.start(), m.group(0).startswith(b"</")) for m in re.finditer(rb"</?w:sectPr\b", tail[:end])]
+    depth = 0
+    for position, closing in reversed(tags):
+        depth += 1 if closing else -1
+        if depth == 0:
+            declarations = " ".join(
+                f'xmlns:{prefix}="{uri}"' if prefix else f'xmlns="{uri}"' for prefix, uri in nsmap.items()
+            )
+            wrapper = f"<wrapper {declarations}>".encode("utf-8") + tail[position:end] + b"</wrapper>"
             try:
-                for section in doc.sections:
-                    new_section = current_doc.sections[-1]
-                    new_section.page_height = section.page_height
-                    new_section.page_width = section.page_width
-                    new_section.left_margin = section.left_margin
-                    new_section.right_margin = section.right_margin
-                    new_section.top_margin = section.top_margin
-                    new_section.bottom_margin = section.bottom_margin
+                return etree.fromstring(wrapper)[0]
+            except etree.XMLSyntaxError:
+                return None
+    return None
+
+def heading_style_ids(zf, heading_styles):
+    """Resolve heading style names (or ids) to the paragraph style ids used in pStyle, mapped to their level."""
+    wanted = {name.lower(): depth for depth, name in enumerate(heading_styles)}
+    ids = {}
+    try:
+        styles = etree.fromstring(zf.read("word/styles.xml"))
+    except KeyError:
+        styles = None
+    if styles is not None:
+        for style in styles.iter(qn("w:style")):
+            style_id = style.get(qn("w:styleId"))
+            name_el = style.find(qn("w:name"))
+            name = name_el.get(qn("w:val")) if name_el is not None else None
+            for candidate in (name, style_id):
+                if candidate and candidate.lower() in wanted:
+                    ids[style_id] = wanted[candidate.lower()]
                     break
-            except Exception:
-                pass
+    for name, depth in wanted.items():
+        ids.setdefault("".join(name.title().split()), depth)
+    return ids
 
-            # Copy blocks (paragraphs & tables) for this section
-            for block in section_blocks:
-                try:
-                    if isinstance(block, Paragraph):
-                        copy_paragraph(block, current_doc, temp_img_dir)
-                    elif isinstance(block, Table):
-                        copy_table(block, current_doc, temp_img_dir)
-                except Exception:
-                    traceback.print_exc()
-                    continue
+def scan_heading_levels(zf, partname, levels_by_id):
+    """
+    First pass of split_docx_streaming over a document part: returns the heading level of
+    every body-level paragraph or table (None for anything but a requested heading), as
+    block_heading_levels does, and the heading texts by block index. Elements are
+    discarded as soon as they are read.
+    """
+    p_tag, tbl_tag = qn("w:p"), qn("w:tbl")
+    style_path = f"{qn('w:pPr')}/{qn('w:pStyle')}"
+    levels, titles = [], {}
+    depth = 0
+    for event, element in etree.iterparse(zf.open(partname), events=("start", "end"), huge_tree=True):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 2:
+            continue
 
-            # Safe filename
-            safe_title = "".join(c for c in title if c.isalnum() or c in " _-").strip()[:50]
-            if not safe_title:
-                safe_title = f"Section_{i+1}"
-            out_path = os.path.join(output_dir, f"{i+1:02d}_{safe_title}.docx")
+        if element.tag in (p_tag, tbl_tag):
+            level = None
+            if element.tag == p_tag:
+                pStyle = element.find(style_path)
+                if pStyle is not None:
+                    level = levels_by_id.get(pStyle.get(qn("w:val")))
+            if level is not None:
+                # Paragraph.text: runs and hyperlinks only, not text boxes
+                titles[len(levels)] = "".join(element.xpath("./w:r/w:t/text() | ./w:hyperlink/w:r/w:t/text()", namespaces=NSMAP))
+            levels.append(level)
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    return levels, titles
+
+def split_docx_streaming(input_path, output_dir, heading_style='Heading 1', progress_callback=None,
+                         rename_mapping=None, intro_title=None):
+    """
+    Bounded-memory splitter for very large DOCX files. word/document.xml is walked twice
+    with lxml iterparse: a light first pass reads the heading level of every body block
+    (see scan_heading_levels) so the sections are planned with plan_heading_sections, as
+    in split_docx_by_heading_v2; the second pass writes each section as soon as its end
+    is reached by repackaging the source parts it references. Memory is bounded by the
+    largest section instead of the whole document.
+
+    Produces the same files and folders as split_docx_by_heading_v2, with the same
+    paragraphs and tables. As the source XML is copied rather than rebuilt, sections also
+    keep their page headers and footers and any other body-level content (content
+    controls, bookmarks), which split_docx_by_heading_v2 drops.
+    progress_callback and rename_mapping behave as in split_docx_by_heading_v2.
+    Returns number of output files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rename, report = section_renamer(rename_mapping, output_dir) if rename_mapping is not None else (None, None)
+
+    with zipfile.ZipFile(input_path, "r") as zf:
+        names = set(zf.namelist())
+
+        main_part = "word/document.xml"
+        for _, reltype, target, _ in read_part_rels(zf, ""):
+            if reltype.endswith("/officeDocument") and target in names:
+                main_part = target
+                break
+
+        levels_by_id = heading_style_ids(zf, heading_style_levels(heading_style))
+
+        # Relationship graph of every part, resolved once per job
+        part_rels = {}
+        for name in names:
+            if "/_rels/" in f"/{name}" and name.endswith(".rels"):
+                directory, rels_name = posixpath.split(name)
+                owner = posixpath.join(posixpath.dirname(directory), rels_name[:-len(".rels")])
+                part_rels[owner] = read_part_rels(zf, owner)
+        document_rels = part_rels.get(main_part, [])
+        content_types = zf.read("[Content_Types].xml")
+
+        def reachable_parts(start_targets):
+            seen = set()
+            stack = [t for t in start_targets if t in names]
+            while stack:
+                part = stack.pop()
+                if part in seen:
+                    continue
+                seen.add(part)
+                for _, _, target, _ in part_rels.get(part, []):
+                    if target and target in names and target not in seen:
+                        stack.append(target)
+            return seen
+
+        package_targets = [t for _, _, t, _ in part_rels.get("", []) if t and t != main_part]
+        shared_parts = reachable_parts(package_targets)
+
+        root = None
+        body = None
+        sectPr = None
+        written = 0
+
+        def write_section(elements, out_path):
+            new_root = etree.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+            new_body = etree.SubElement(new_root, body.tag, attrib=dict(body.attrib))
+            for element in elements:
+                new_body.append(element)
+            if sectPr is not None:
+                new_body.append(copy.deepcopy(sectPr))
+
+            referenced = set(new_root.xpath("//@r:*", namespaces=NSMAP))
+            kept_rels = etree.Element(f"{{{RELS_NS}}}Relationships", nsmap={None: RELS_NS})
+            body_targets = []
+            for rId, reltype, target, rel in document_rels:
+                if rId in referenced or reltype.rsplit("/", 1)[-1] not in BODY_RELTYPES:
+                    kept_rels.append(copy.deepcopy(rel))
+                    if target:
+                        body_targets.append(target)
+
+            parts = shared_parts | reachable_parts(body_targets)
+            parts.add(main_part)
+
+            types = etree.fromstring(content_types)
+            for override in types.findall(f"{{{CONTENT_TYPES_NS}}}Override"):
+                if override.get("PartName", "").lstrip("/") not in parts:
+                    types.remove(override)
+
+            with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as out:
+                out.writestr("[Content_Types].xml", etree.tostring(types, xml_declaration=True, encoding="UTF-8", standalone=True))
+                out.writestr("_rels/.rels", zf.read("_rels/.rels"))
+                out.writestr(main_part, etree.tostring(new_root, xml_declaration=True, encoding="UTF-8", standalone=True))
+                out.writestr(rels_path_for(main_part), etree.tostring(kept_rels, xml_declaration=True, encoding="UTF-8", standalone=True))
+                for part in sorted(parts):
+                    if part == main_part:
+                        continue
+                    info = zf.getinfo(part)
+                    out.writestr(part, zf.read(part), compress_type=info.compress_type)
+                    part_rels_name = rels_path_for(part)
+                    if part_rels_name in names:
+                        out.writestr(part_rels_name, zf.read(part_rels_name))
+
+        levels, titles = scan_heading_levels(zf, main_part, levels_by_id)
+        if not levels:
+            return 0
+        plan = plan_heading_sections(levels, 0, len(levels))
+        sections = list(iter_planned_sections(titles, levels, plan, output_dir, intro_title, rename=rename))
+        if progress_callback:
+            progress_callback(0, len(sections), None)
 
+        def flush(elements, out_path):
+            nonlocal written
             try:
-                current_doc.save(out_path)
+                write_section(elements, out_path)
+                written += 1
             except Exception:
                 traceback.print_exc()
+                return
+            if progress_callback:
+                progress_callback(written, len(sections), out_path)
+
+        # Body-level content that is not a block stays with the section of the block before
+        remaining = iter(sections)
+        out_path, _, section_end = next(remaining)
+        elements = []
+        block = 0
+        depth = 0
+        block_tags = (qn("w:p"), qn("w:tbl"))
+        for event, element in etree.iterparse(zf.open(main_part), events=("start", "end"), huge_tree=True):
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = element
+                elif depth == 2 and element.tag == qn("w:body"):
+                    body = element
+                    sectPr = read_final_sectPr(zf, main_part, root.nsmap)
                 continue
 
-        return total_sections
-    finally:
-        try:
-            if os.path.exists(temp_img_dir):
-                shutil.rmtree(temp_img_dir)
-        except Exception:
-            pass
+            depth -= 1
+            if depth != 2 or body is None or element.getparent() is not body:
+                continue
+
+            if element.tag == qn("w:sectPr"):
+                body.remove(element)
+                continue
+
+            if element.tag in block_tags:
+                if block == section_end:
+                    flush(elements, out_path)
+                    elements = []
+                    out_path, _, section_end = next(remaining)
+                block += 1
+            elements.append(element)
+
+        flush(elements, out_path)
+
+    if report is not None:
+        write_rename_report(report, output_dir)
+    return written
 
 # ============================================================================
 # 4. File Renamer
 # ============================================================================
 
-def rename_files_batch(folder_path, old_text, new_text):
-    """Batch rename files in a folder."""
-    count = 0
-    for filename in os.listdir(folder_path):
-        if old_text in filename:
-            new_filename = filename.replace(old_text, new_text)
-            os.rename(
-                os.path.join(folder_path, filename),
-                os.path.join(folder_path, new_filename)
-            )
-            count += 1
-    return count
+RENAME_CASE_MODES = {'upper': str.upper, 'lower': str.lower, 'title': str.title}
+RENAME_SEQUENCE_FIELDS = ('n', 'name')
+RENAME_ERRORS_NAME = "rename_errors.json"
+
+def compile_rename_rules(rules):
+    r"""
+    Compile an ordered list of rename rules, applied in turn to every name by
+    plan_rename_rules. Each rule is a dict with a 'type':
+      literal:  {'find': 'old', 'replace': 'new'}
+      regex:    {'pattern': r'(\w+)-(\d+)', 'replace': r'\2_\1', 'ignore_case': False}
+      case:     {'mode': 'upper' | 'lower' | 'title'}
+      sequence: {'format': '{n}_{name}', 'start': 1, 'step': 1, 'width': 3}
+    Rules edit the name without its extension, or the whole file name with 'scope':
+    'filename'. Sequence formats may only use the plain fields {n} and {name}, and
+    sequence numbers follow the sorted order of the names. Raises ValueError for an
+    invalid rule.
+    """
+    compiled = []
+    for position, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            raise ValueError(f'Rule {position} must be an object')
+        kind = rule.get('type')
+        
+        if kind == 'literal':
+            find, replace = str(rule.get('find', '')), str(rule.get('replace', ''))
+            if not find:
+                raise ValueError(f'Rule {position}: literal rules need a find text')
+            edit = lambda name, index, find=find, replace=replace: name.replace(find, replace)
+        elif kind == 'regex':
+            try:
+                pattern = re.compile(str(rule.get('pattern', '')), re.IGNORECASE if rule.get('ignore_case') else 0)
+                replace = str(rule.get('replace', ''))
+                # Group references are checked against the pattern now rather than per name
+                pattern.sub(replace, '')
+            except (re.error, IndexError) as e:
+                raise ValueError(f'Rule {position}: {e}')
+            if not pattern.pattern:
+                raise ValueError(f'Rule {position}: regex rules need a pattern')
+            edit = lambda name, index, pattern=pattern, replace=replace: pattern.sub(replace, name)
+        elif kind == 'case':
+            transform = RENAME_CASE_MODES.get(rule.get('mode'))
+            if transform is None:
+                raise ValueError(f"Rule {position}: case mode must be one of {', '.join(RENAME_CASE_MODES)}")
+            edit = lambda name, index, transform=transform: transform(name)
+        elif kind == 'sequence':
+            template = str(rule.get('format', '{n}_{name}'))
+            try:
+                start, step, width = int(rule.get('start', 1)), int(rule.get('step', 1)), int(rule.get('width', 1))
+                # Attribute and index access ({n.x}, {name.upper}, {n[0]}) would reach into str
+                for _, field, _, _ in string.Formatter().parse(template):
+                    if field is not None and field not in RENAME_SEQUENCE_FIELDS:
+                        raise ValueError(f"unknown field {{{field}}}, use {{n}} or {{name}}")
+                template.format(n='1', name='name')
+            except Exception as e:
+                raise ValueError(f'Rule {position}: invalid sequence: {e}')
+            edit = lambda name, index, template=template, start=start, step=step, width=width: \
+                template.format(n=str(start + index * step).zfill(width), name=name)
+        else:
+            raise ValueError(f'Rule {position}: unknown rule type {kind!r}')
+        
+        compiled.append((edit, rule.get('scope') == 'filename'))
+    return compiled
+
+def apply_rename_rules(filename, compiled, index=0):
+    """New name of filename, the index-th name of its batch, under compiled rename rules."""
+    stem, ext = os.path.splitext(filename)
+    for edit, whole_name in compiled:
+        if whole_name:
+            stem, ext = os.path.splitext(edit(stem + ext, index))
+        else:
+            stem = edit(stem, index)
+    # Rules must not move a file out of the archive root
+    return (stem + ext).replace('/', '_').replace('\\', '_').strip()
 
-def generate_rename_preview_from_excel(excel_path, docx_folder):
+def plan_rename_rules(filenames, compiled):
     """
-    Generate a preview of file renames based on Excel mapping.
-    Returns a dictionary with preview list and excel_data.
+    Dry run of compiled rename rules over a list of file names, in a single pass and without
+    touching any file. Returns [{'original_name', 'new_name', 'exists'}] for the names that
+    change; exists flags a new name already taken by another listed file or an earlier entry.
     """
-    try:
-        df = pd.read_excel(excel_path)
-    except Exception as e:
-        return {'error': f'Failed to read Excel: {str(e)}'}
+    taken = set(filenames)
+    plan = []
+    for index, filename in enumerate(sorted(filenames)):
+        new_filename = apply_rename_rules(filename, compiled, index)
+        if not new_filename or new_filename == filename:
+            continue
+        exists = new_filename in taken
+        taken.add(new_filename)
+        plan.append({'original_name': filename, 'new_name': new_filename, 'exists': exists})
+    return plan
+
+def write_renamed_archive(folder_path, filenames, targets, zip_path, compression=zipfile.ZIP_DEFLATED):
+    """
+    Stream the listed files of folder_path into a new ZIP archive at zip_path, under
+    targets[name] for the renamed ones; nothing is moved on disk. Files keeping their
+    name hold it, and a renamed file whose new name is taken gets a _1, _2 suffix.
+    Files that could not be written are listed in rename_errors.json in the archive.
+    Returns count of renamed files and any errors.
+    """
+    renamed = 0
+    errors = []
+    taken = set(filenames) - set(targets)
+    entries = [(name, name) for name in sorted(filenames) if name not in targets]
+    for original_name, new_name in targets.items():
+        if new_name in taken:
+            base, ext = os.path.splitext(new_name)
+            i = 1
+            while f"{base}_{i}{ext}" in taken:
+                i += 1
+            new_name = f"{base}_{i}{ext}"
+        taken.add(new_name)
+        entries.append((original_name, new_name))
+    
+    with zipfile.ZipFile(zip_path, 'w', compression) as archive:
+        for original_name, new_name in entries:
+            try:
+                archive.write(os.path.join(folder_path, original_name), new_name)
+                if new_name != original_name:
+                    renamed += 1
+            except Exception as e:
+                errors.append(f"Failed to rename {original_name}: {str(e)}")
+        if errors:
+            archive.writestr(RENAME_ERRORS_NAME, json.dumps(errors, indent=2))
     
-    # Find columns (case-insensitive)
-    cols_lower = [c.lower().strip() for c in df.columns]
+    return renamed, errors
+
+def rename_files_batch(folder_path, rules, zip_path):
+    """
+    Batch rename files in a folder with compiled rename rules (see compile_rename_rules),
+    writing the renamed set straight into a ZIP archive at zip_path.
+    Returns count of renamed files and any errors.
+    """
+    filenames = os.listdir(folder_path)
+    plan = plan_rename_rules(filenames, rules)
+    targets = {item['original_name']: item['new_name'] for item in plan}
+    return write_renamed_archive(folder_path, filenames, targets, zip_path)
+
+DOC_NAME_COLUMNS = ["Doc_Name", "Doc Name", "doc_name", "doc name", "DocName", "filename", "File", "FileName"]
+DMC_CODE_COLUMNS = ["DMC_Code", "DMC Code", "dmc_code", "dmc code", "DMC"]
+
+EXCEL_MAPPING_CACHE = OrderedDict()
+EXCEL_MAPPING_CACHE_SIZE = 16
+_excel_mapping_lock = threading.Lock()
+
+def find_mapping_columns(header):
+    """Return the (doc name, DMC code) column positions in a header row, or None for missing ones."""
+    cols_lower = [str(c).lower().strip() if c is not None else '' for c in header]
     
     def find_col(names):
         for n in names:
             if n.lower() in cols_lower:
-                return df.columns[cols_lower.index(n.lower())]
+                return cols_lower.index(n.lower())
         return None
     
-    doc_col = find_col(["Doc_Name", "Doc Name", "doc_name", "doc name", "DocName", "filename", "File", "FileName"])
-    dmc_col = find_col(["DMC_Code", "DMC Code", "dmc_code", "dmc code", "DMC"])
+    return find_col(DOC_NAME_COLUMNS), find_col(DMC_CODE_COLUMNS)
+
+def read_mapping_columns(excel_path):
+    """
+    Read only the Doc Name and DMC Code columns of a mapping sheet as two pandas Series.
+    .xlsx is streamed with openpyxl in read-only mode, .csv goes through pandas' C parser
+    and anything else (.xls) falls back to pd.read_excel. Returns None when a column is missing.
+    """
+    ext = os.path.splitext(excel_path)[1].lower()
+    if ext == '.csv':
+        header = pd.read_csv(excel_path, nrows=0, encoding='utf-8-sig').columns
+        doc_idx, dmc_idx = find_mapping_columns(header)
+        if doc_idx is None or dmc_idx is None:
+            return None
+        df = pd.read_csv(excel_path, usecols=[doc_idx, dmc_idx], dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        return df[header[doc_idx]], df[header[dmc_idx]]
     
-    if not doc_col or not dmc_col:
+    if ext in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(excel_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            doc_idx, dmc_idx = find_mapping_columns(header)
+            if doc_idx is None or dmc_idx is None:
+                return None
+            # Only the cells between the two columns are converted
+            first = min(doc_idx, dmc_idx)
+            rows = sheet.iter_rows(min_row=2, min_col=first + 1, max_col=max(doc_idx, dmc_idx) + 1, values_only=True)
+            df = pd.DataFrame.from_records(list(rows))
+        finally:
+            workbook.close()
+        if df.empty:
+            return pd.Series(dtype=object), pd.Series(dtype=object)
+        return df[doc_idx - first], df[dmc_idx - first]
+    
+    df = pd.read_excel(excel_path)
+    doc_idx, dmc_idx = find_mapping_columns(df.columns)
+    if doc_idx is None or dmc_idx is None:
+        return None
+    return df.iloc[:, doc_idx], df.iloc[:, dmc_idx]
+
+def clean_mapping_column(column):
+    """Vectorized cell cleanup: strip, and blank out empty cells (None, NaN, 'nan')."""
+    column = column.astype(object).where(column.notna(), '').astype(str).str.strip()
+    return column.mask(column.str.lower() == 'nan', '')
+
+def parse_excel_mapping(excel_path):
+    """Parse a mapping sheet into the load_excel_mapping result (uncached)."""
+    try:
+        columns = read_mapping_columns(excel_path)
+    except Exception as e:
+        return {'error': f'Failed to read Excel: {str(e)}'}
+    
+    if columns is None:
         return {'error': 'Excel must contain Doc Name and DMC Code columns'}
     
-    # Extract Excel data for display
-    excel_data = []
-    for _, row in df.iterrows():
-        doc_name = str(row[doc_col]).strip()
-        dmc_code = str(row[dmc_col]).strip()
-        if doc_name and dmc_code and doc_name.lower() != 'nan' and dmc_code.lower() != 'nan':
-            excel_data.append({
-                'doc_name': doc_name,
-                'dmc_code': dmc_code
-            })
+    doc_names = clean_mapping_column(columns[0])
+    dmc_codes = clean_mapping_column(columns[1])
+    valid = (doc_names != '') & (dmc_codes != '')
+    doc_names, dmc_codes = doc_names[valid], dmc_codes[valid]
+    keys = doc_names.str.lower()
     
-    # Build mapping
-    df[doc_col] = df[doc_col].astype(str).str.strip()
-    df[dmc_col] = df[dmc_col].astype(str).str.strip()
+    # The last row for a doc name wins, earlier rows are reported as duplicates
+    mapping = dict(zip(keys, dmc_codes))
+    repeated = keys.duplicated(keep=False)
+    duplicates = [
+        {'doc_name': key, 'dmc_codes': list(codes), 'used': codes.iloc[-1]}
+        for key, codes in dmc_codes[repeated].groupby(keys[repeated], sort=False)
+    ]
+    
+    return {
+        'mapping': mapping,
+        'excel_data': [{'doc_name': d, 'dmc_code': c} for d, c in zip(doc_names, dmc_codes)],
+        'duplicates': duplicates
+    }
+
+def load_excel_mapping(excel_path):
+    """
+    Read a Doc Name -> DMC Code mapping sheet (.xlsx, .xls or .csv).
+    Returns {'mapping': {lowercase doc name: dmc code}, 'excel_data': [...], 'duplicates': [...]}
+    or {'error': ...}. Parsed sheets are cached by content hash, so repeated previews of the
+    same workbook skip parsing; callers must not modify the returned dict, which also
+    holds the sheet's lookup indexes once built (see cached_sheet_index).
+    """
+    key = file_sha1(excel_path)
+    with _excel_mapping_lock:
+        loaded = EXCEL_MAPPING_CACHE.get(key)
+        if loaded is not None:
+            EXCEL_MAPPING_CACHE.move_to_end(key)
+            return loaded
     
-    mapping = {}
-    for _, row in df.iterrows():
-        doc_name = str(row[doc_col]).strip()
-        dmc_code = str(row[dmc_col]).strip()
-        if doc_name and dmc_code and doc_name.lower() != 'nan' and dmc_code.lower() != 'nan':
-            mapping[doc_name.lower()] = dmc_code
+    loaded = parse_excel_mapping(excel_path)
+    if 'error' in loaded:
+        return loaded
     
-    # Generate preview with improved matching
+    with _excel_mapping_lock:
+        EXCEL_MAPPING_CACHE[key] = loaded
+        while len(EXCEL_MAPPING_CACHE) > EXCEL_MAPPING_CACHE_SIZE:
+            EXCEL_MAPPING_CACHE.popitem(last=False)
+    return loaded
+
+def cached_sheet_index(loaded, name, build):
+    """
+    Index of a loaded mapping sheet (build_mapping_index or build_suggestion_index), built
+    from its mapping on first use and kept under name in the sheet's EXCEL_MAPPING_CACHE
+    entry, so repeated previews of the same workbook build it once.
+    """
+    with _excel_mapping_lock:
+        index = loaded.get(name)
+    if index is None:
+        index = build(loaded['mapping'])
+        with _excel_mapping_lock:
+            index = loaded.setdefault(name, index)
+    return index
+
+MAPPING_KEY_SEPARATORS = str.maketrans('', '', '_- ')
+
+def normalize_mapping_key(name):
+    """Lowercase name with the common separators (_, -, space) removed."""
+    return name.lower().strip().translate(MAPPING_KEY_SEPARATORS)
+
+def build_mapping_index(mapping):
+    """
+    Index a Doc Name -> DMC Code mapping once per sheet so find_mapping_key is O(1).
+    Returns {'exact': mapping, 'normalized': {normalized key: mapping key}, 'collisions': [...]}.
+    When several doc names normalize to the same key the first one in sheet order is used
+    and the group is listed under 'collisions'.
+    """
+    normalized = {}
+    groups = {}
+    for key in mapping:
+        norm = normalize_mapping_key(key)
+        normalized.setdefault(norm, key)
+        groups.setdefault(norm, []).append(key)
+    
+    collisions = [
+        {'normalized': norm, 'doc_names': keys, 'used': keys[0]}
+        for norm, keys in groups.items() if len(keys) > 1
+    ]
+    return {'exact': mapping, 'normalized': normalized, 'collisions': collisions}
+
+def find_mapping_key(name, index):
+    """
+    Return the mapping key matching name using an index from build_mapping_index: exact
+    (case-insensitive) first, then after removing common separators. None when nothing matches.
+    """
+    key = name.lower().strip()
+    if key in index['exact']:
+        return key
+    return index['normalized'].get(normalize_mapping_key(key))
+
+SUGGESTION_NGRAM = 3
+SUGGESTION_CANDIDATES = 25
+SUGGESTION_COMMON_NGRAM = 0.05
+
+def name_ngrams(normalized):
+    """Character n-grams of a normalized name, padded so short names still produce some."""
+    padded = f"^{normalized}$"
+    if len(padded) <= SUGGESTION_NGRAM:
+        return {padded}
+    return {padded[i:i + SUGGESTION_NGRAM] for i in range(len(padded) - SUGGESTION_NGRAM + 1)}
+
+def build_suggestion_index(mapping):
+    """
+    Build an n-gram inverted index over the mapping keys, once per sheet, for
+    suggest_mapping_keys. Returns {'keys': [...], 'normalized': [...], 'ngrams': {gram:
+    key ids as a numpy array}} plus the normalized keys as symbol codes for
+    batch_edit_distances: 'symbols' {char: code}, 'codes' (all keys end to end),
+    'offsets' and 'lengths' per key.
+    """
+    keys = list(mapping)
+    normalized = [normalize_mapping_key(key) for key in keys]
+    ngrams = {}
+    for key_id, norm in enumerate(normalized):
+        for gram in name_ngrams(norm):
+            ngrams.setdefault(gram, []).append(key_id)
+    ngrams = {gram: np.array(ids, dtype=np.int32) for gram, ids in ngrams.items()}
+    
+    symbols = {}
+    codes = [symbols.setdefault(c, len(symbols)) for norm in normalized for c in norm]
+    lengths = np.array([len(norm) for norm in normalized], dtype=np.int64)
+    return {
+        'keys': keys,
+        'normalized': normalized,
+        'ngrams': ngrams,
+        'symbols': symbols,
+        'codes': np.array(codes, dtype=np.int64),
+        'offsets': np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64),
+        'lengths': lengths,
+    }
+
+def edit_distance_to(a):
+    """
+    Return distance(b), the Levenshtein distance from a to b, using the bit-parallel
+    algorithm of Myers/Hyyroe: a's character masks are built once and every comparison
+    is a few integer operations per character of b.
+    """
+    if not a:
+        return len
+    masks = {}
+    for i, c in enumerate(a):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+
+    def distance(b):
+        vp, vn, d = full, 0, len(a)
+        for c in b:
+            x = masks.get(c, 0) | vn
+            d0 = (((x & vp) + vp) ^ vp) | x
+            hp = vn | (~(d0 | vp) & full)
+            hn = d0 & vp
+            if hp & last:
+                d += 1
+            elif hn & last:
+                d -= 1
+            hp = ((hp << 1) | 1) & full
+            hn = (hn << 1) & full
+            vp = hn | (~(d0 | hp) & full)
+            vn = hp & d0
+        return d
+
+    return distance
+
+def batch_edit_distances(patterns, pattern_ids, key_ids, suggestion_index):
+    """
+    Levenshtein distance from patterns[pattern_ids[i]] to normalized mapping key key_ids[i]
+    for every i at once: the algorithm of edit_distance_to runs on numpy uint64 lanes, one
+    lane per pair and one step per character of the longest key. Patterns longer than 64
+    characters do not fit a lane and are compared one by one. Returns an int64 array.
+    """
+    symbols = suggestion_index['symbols']
+    key_lengths = suggestion_index['lengths'][key_ids]
+    pattern_lengths = np.array([len(p) for p in patterns], dtype=np.int64)[pattern_ids]
+    distances = np.empty(len(key_ids), dtype=np.int64)
+    
+    # Match masks per pattern and key symbol; the extra last column, for characters no
+    # key contains, stays empty
+    masks = {}
+    for row, pattern in enumerate(patterns):
+        if len(pattern) <= 64:
+            for i, c in enumerate(pattern):
+                if c in symbols:
+                    masks[row, symbols[c]] = masks.get((row, symbols[c]), 0) | (1 << i)
+    peq = np.zeros((len(patterns), len(symbols) + 1), dtype=np.uint64)
+    if masks:
+        cells = np.array(list(masks), dtype=np.int64)
+        peq[cells[:, 0], cells[:, 1]] = np.array(list(masks.values()), dtype=np.uint64)
+    
+    wide = (pattern_lengths == 0) | (pattern_lengths > 64)
+    for i in np.flatnonzero(wide).tolist():
+        key = suggestion_index['normalized'][key_ids[i]]
+        distances[i] = edit_distance_to(patterns[pattern_ids[i]])(key)
+    
+    # Lanes ordered by key length, longest first, so the lanes still running at step j
+    # are always a prefix
+    lanes = np.flatnonzero(~wide)
+    lanes = lanes[np.argsort(-key_lengths[lanes], kind='stable')]
+    rows, lengths = pattern_ids[lanes], key_lengths[lanes]
+    starts = suggestion_index['offsets'][key_ids[lanes]]
+    last = np.uint64(1) << (pattern_lengths[lanes] - 1).astype(np.uint64)
+    full = (last << np.uint64(1)) - np.uint64(1)  # wraps to all ones for 64 characters
+    vp, vn = full.copy(), np.zeros(len(lanes), dtype=np.uint64)
+    d = pattern_lengths[lanes].copy()
+    running = len(lanes) - np.searchsorted(lengths[::-1], np.arange(int(lengths.max(initial=0))), side='right')
+    one = np.uint64(1)
+    for j, n in enumerate(running.tolist()):
+        x = peq[rows[:n], suggestion_index['codes'][starts[:n] + j]] | vn[:n]
+        d0 = (((x & vp[:n]) + vp[:n]) ^ vp[:n]) | x
+        hp = vn[:n] | (~(d0 | vp[:n]) & full[:n])
+        hn = d0 & vp[:n]
+        d[:n] += (hp & last[:n]) != 0
+        d[:n] -= (hn & last[:n]) != 0
+        hp = ((hp << one) | one) & full[:n]
+        hn = (hn << one) & full[:n]
+        vp[:n] = hn | (~(d0 | hp) & full[:n])
+        vn[:n] = hp & d0
+    distances[lanes] = d
+    return distances
+
+def shortlist_mapping_keys(norm, suggestion_index):
+    """
+    The SUGGESTION_CANDIDATES keys sharing the most n-grams with a normalized name, ties
+    going to the earlier row of the sheet. N-grams found in more than
+    SUGGESTION_COMMON_NGRAM of the keys are ignored, as they rank nothing and would make
+    every lookup touch the whole sheet. Returns (key ids, shared n-gram counts).
+    """
+    ngrams = suggestion_index['ngrams']
+    postings = [ngrams[gram] for gram in name_ngrams(norm) if gram in ngrams]
+    if not postings:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    common = max(SUGGESTION_CANDIDATES, len(suggestion_index['keys']) * SUGGESTION_COMMON_NGRAM)
+    selective = [posting for posting in postings if len(posting) <= common]
+    if not selective:
+        # Only common n-grams: the three rarest still narrow the sheet down
+        grams = sorted((gram for gram in name_ngrams(norm) if gram in ngrams), key=lambda gram: (len(ngrams[gram]), gram))
+        selective = [ngrams[gram] for gram in grams[:3]]
+    
+    key_ids, shared = np.unique(np.concatenate(selective), return_counts=True)
+    if len(key_ids) > SUGGESTION_CANDIDATES:
+        # Only the keys at or above the SUGGESTION_CANDIDATES-th best count are ordered
+        cut = len(shared) - SUGGESTION_CANDIDATES
+        keep = shared >= np.partition(shared, cut)[cut]
+        key_ids, shared = key_ids[keep], shared[keep]
+    order = np.lexsort((key_ids, -shared))[:SUGGESTION_CANDIDATES]
+    return key_ids[order].astype(np.int64), shared[order]
+
+def suggest_mapping_keys(names, suggestion_index, mapping, k=5, min_score=0.5):
+    """
+    Rank the closest mapping keys for names that have no exact or normalized match.
+    Each name's candidates are shortlisted through the n-gram index (see
+    shortlist_mapping_keys), then every candidate of every name is scored at once by
+    normalized edit distance (1.0 = identical after normalization, see
+    batch_edit_distances). Returns, per name, up to k [{'doc_name', 'dmc_code', 'score'}],
+    best first; ties go to the key sharing more n-grams, then to the earlier row.
+    """
+    patterns = [normalize_mapping_key(name) for name in names]
+    pattern_ids, key_ids, shared = [], [], []
+    for row, norm in enumerate(patterns):
+        if not norm:
+            continue
+        candidates, counts = shortlist_mapping_keys(norm, suggestion_index)
+        pattern_ids.append(np.full(len(candidates), row, dtype=np.int64))
+        key_ids.append(candidates)
+        shared.append(counts)
+    
+    suggestions = [[] for _ in names]
+    if not key_ids:
+        return suggestions
+    pattern_ids, key_ids, shared = np.concatenate(pattern_ids), np.concatenate(key_ids), np.concatenate(shared)
+    distances = batch_edit_distances(patterns, pattern_ids, key_ids, suggestion_index)
+    longest = np.maximum(np.array([len(p) for p in patterns])[pattern_ids], suggestion_index['lengths'][key_ids])
+    scores = 1 - distances / longest
+    
+    kept = np.flatnonzero(scores >= min_score)
+    kept = kept[np.lexsort((key_ids[kept], -shared[kept], -scores[kept], pattern_ids[kept]))]
+    for i in kept.tolist():
+        row = suggestions[pattern_ids[i]]
+        if len(row) < k:
+            key = suggestion_index['keys'][key_ids[i]]
+            row.append({'doc_name': key, 'dmc_code': mapping[key], 'score': round(float(scores[i]), 3)})
+    return suggestions
+
+def dmc_filename_stem(dmc_code):
+    """Sanitize a DMC code for use as a file name."""
+    return "".join(c for c in dmc_code if c.isalnum() or c in (" ", "-", "_")).strip()
+
+def generate_rename_preview_from_excel(excel_path, docx_folder, filenames=None):
+    """
+    Generate a preview of file renames based on Excel mapping.
+    The files are those in docx_folder or, in manifest mode, the given list of file names,
+    in which case no file is touched and the preview is the rename plan for the client.
+    Returns a dictionary with preview list and excel_data.
+    """
+    loaded = load_excel_mapping(excel_path)
+    if 'error' in loaded:
+        return loaded
+    mapping = loaded['mapping']
+    excel_data = loaded['excel_data']
+    index = cached_sheet_index(loaded, 'mapping_index', build_mapping_index)
+    
+    # Generate preview with improved matching; near-miss suggestions for unmatched
+    # files are ranked together once every file has been looked up
     preview = []
+    unmatched = []
     unmatched_excel_entries = set(mapping.keys())
+    if filenames is None:
+        filenames = os.listdir(docx_folder)
+    existing = set(filenames)
     
-    for filename in sorted(os.listdir(docx_folder)):
+    for filename in sorted(existing):
         if filename.lower().endswith('.docx'):
             base_name = os.path.splitext(filename)[0]
-            key = base_name.lower().strip()
-            
-            # Try exact match first
-            matched_key = None
-            if key in mapping:
-                matched_key = key
-            else:
-                # Try fuzzy matching - check if any Excel entry is a substring or vice versa
-                for excel_key in mapping.keys():
-                    # Check if filenames match after removing common separators
-                    normalized_file = key.replace('_', '').replace('-', '').replace(' ', '')
-                    normalized_excel = excel_key.replace('_', '').replace('-', '').replace(' ', '')
-                    
-                    if normalized_file == normalized_excel:
-                        matched_key = excel_key
-                        break
+            matched_key = find_mapping_key(base_name, index)
             
             if matched_key:
                 dmc_code = mapping[matched_key]
                 unmatched_excel_entries.discard(matched_key)
                 
                 # Sanitize DMC code for filename
-                safe_dmc = "".join(c for c in dmc_code if c.isalnum() or c in (" ", "-", "_")).strip()
+                safe_dmc = dmc_filename_stem(dmc_code)
                 new_filename = f"{safe_dmc}.docx"
                 
                 # Check if new name already exists
-                new_path = os.path.join(docx_folder, new_filename)
-                exists = os.path.exists(new_path) and new_path != os.path.join(docx_folder, filename)
+                exists = new_filename in existing and new_filename != filename
                 
                 preview.append({
                     'original_name': filename,
@@ -819,218 +1714,1021 @@ def generate_rename_preview_from_excel(excel_path, docx_folder):
                     'matched_excel_key': matched_key  # Add for debugging
                 })
             else:
-                preview.append({
+                unmatched.append({
                     'original_name': filename,
                     'new_name': filename,
                     'dmc_code': '',
                     'exists': False,
                     'status': '⚠ no_mapping',
                     'base_name': base_name,  # Add for debugging
-                    'available_matches': list(mapping.keys())[:5] if len(mapping) <= 5 else []  # Show possible matches
                 })
+                preview.append(unmatched[-1])
+    
+    if unmatched:
+        suggestion_index = cached_sheet_index(loaded, 'suggestion_index', build_suggestion_index)
+        ranked = suggest_mapping_keys([item['base_name'] for item in unmatched], suggestion_index, mapping)
+        for item, suggestions in zip(unmatched, ranked):
+            item['available_matches'] = [s['doc_name'] for s in suggestions]  # Show possible matches
+            item['suggestions'] = suggestions
     
     return {
         'preview': preview,
-        'excel_data': excel_data
+        'excel_data': excel_data,
+        'duplicates': loaded['duplicates'],
+        'collisions': index['collisions']
     }
 
-def execute_rename_from_excel(excel_path, docx_folder, preview_data):
+def execute_rename_from_excel(docx_folder, preview_data, zip_path, filenames=None):
     """
-    Execute the rename based on preview data.
+    Execute the rename based on preview data by streaming the files of docx_folder (or only
+    the given filenames, when the caller already knows them) into a new ZIP archive at
+    zip_path under their new names (see write_renamed_archive).
     Returns count of renamed files and any errors.
     """
-    renamed = 0
-    errors = []
+    filenames = os.listdir(docx_folder) if filenames is None else filenames
+    present = set(filenames)
     
+    targets = {}
     for item in preview_data:
-        if '✓' in item['status']:  # Check for ready status (with ✓ icon)
-            old_path = os.path.join(docx_folder, item['original_name'])
-            new_path = os.path.join(docx_folder, item['new_name'])
-            
+        if '✓' in item.get('status', '') and item.get('original_name') in present:  # Check for ready status (with ✓ icon)
             # Skip if already same name
-            if old_path == new_path:
-                continue
-            
-            # Handle conflicts by adding number suffix
-            if os.path.exists(new_path):
-                base, ext = os.path.splitext(item['new_name'])
-                i = 1
-                while os.path.exists(os.path.join(docx_folder, f"{base}_{i}{ext}")):
-                    i += 1
-                new_path = os.path.join(docx_folder, f"{base}_{i}{ext}")
-            
-            try:
-                shutil.move(old_path, new_path)
-                renamed += 1
-            except Exception as e:
-                errors.append(f"Failed to rename {item['original_name']}: {str(e)}")
+            if item['new_name'] != item['original_name']:
+                targets[item['original_name']] = item['new_name']
     
-    return renamed, errors
+    # DOCX files are already deflated, so they are stored as they are
+    return write_renamed_archive(docx_folder, filenames, targets, zip_path, zipfile.ZIP_STORED)
 
 # ============================================================================
 # 5. ICN Extractor
 # ============================================================================
 
-def extract_icn_from_docx(input_dir, output_dir):
-    """Extract images with ICN tags from DOCX files."""
-    os.makedirs(output_dir, exist_ok=True)
+ICN_PATTERN = re.compile(r'ICN-\s*([\w\-.]+)')
+
+def scan_icn_text(docx_path):
+    """
+    Stream word/document.xml with iterparse and record, in document order, every image
+    reference and every ICN label match, without keeping the tree: body-level elements
+    are cleared as soon as they end, so memory stays flat for very large documents.
+    Paragraph text is gathered per paragraph (text boxes count as their own paragraphs)
+    and matched with ICN_PATTERN once the paragraph ends. mc:Fallback content (the VML
+    copy of a drawing and of its text-box paragraphs) is skipped, so each image and each
+    caption is seen once.
+
+    Returns {'images': [(paragraph ordinal, rId)],
+             'labels': [{'label', 'paragraph', 'images_before'}]}, where images_before is
+    the number of image references that precede the match in the document.
+    """
+    p_tag, t_tag, body_tag = qn("w:p"), qn("w:t"), qn("w:body")
+    blip_tag, imagedata_tag = qn("a:blip"), f"{{{NSMAP['v']}}}imagedata"
+    fallback_tag = f"{{{NSMAP['mc']}}}Fallback"
+    blip_embed, imagedata_id = qn("r:embed"), qn("r:id")
+    
+    images = []
+    labels = []
+    paragraphs = []  # open paragraphs: (ordinal, text pieces, images seen at each piece)
+    ordinal = 0
+    fallback_depth = 0
+    with zipfile.ZipFile(docx_path, "r") as zf, zf.open("word/document.xml") as stream:
+        for event, element in etree.iterparse(stream, events=("start", "end"), huge_tree=True):
+            tag = element.tag
+            if event == "start":
+                if tag == p_tag and not fallback_depth:
+                    paragraphs.append((ordinal, [], []))
+                    ordinal += 1
+                elif tag == fallback_tag:
+                    fallback_depth += 1
+                continue
+            
+            if tag == t_tag:
+                if element.text and paragraphs and not fallback_depth:
+                    paragraphs[-1][1].append(element.text)
+                    paragraphs[-1][2].append(len(images))
+            elif tag == blip_tag or tag == imagedata_tag:
+                rId = element.get(blip_embed if tag == blip_tag else imagedata_id)
+                if rId and not fallback_depth:
+                    images.append((paragraphs[-1][0] if paragraphs else None, rId))
+            elif tag == p_tag:
+                if fallback_depth:
+                    continue
+                paragraph, pieces, seen = paragraphs.pop()
+                text = "".join(pieces)
+                if "ICN" in text:
+                    ends = list(accumulate(len(piece) for piece in pieces))
+                    for match in ICN_PATTERN.finditer(text):
+                        labels.append({
+                            "label": f"ICN-{match.group(1)}",
+                            "paragraph": paragraph,
+                            "images_before": seen[bisect_right(ends, match.start())],
+                        })
+            elif tag == fallback_tag:
+                fallback_depth -= 1
+            
+            parent = element.getparent()
+            if parent is not None and parent.tag == body_tag:
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+    
+    return {"images": images, "labels": labels}
+
+def pair_icn_images(scan, image_targets):
+    """
+    Pair the images found by scan_icn_text with ICN labels, in document order.
+    A label names the latest unlabelled image since the previous label (figure, then
+    caption); a label with no such image waits for the next image (caption above the
+    figure). Returns [(media part name, label or None)] per image occurrence.
+    """
+    images = []
+    unlabelled = []
+    waiting_labels = []
+    labels = scan['labels']
+    next_label = 0
+    for position in range(len(scan['images']) + 1):
+        # Labels found before this image
+        while next_label < len(labels) and labels[next_label]['images_before'] <= position:
+            label = labels[next_label]['label']
+            next_label += 1
+            if unlabelled:
+                unlabelled.pop()[1] = label
+                unlabelled = []
+            else:
+                waiting_labels.append(label)
+        if position == len(scan['images']):
+            break
+        
+        target = image_targets.get(scan['images'][position][1])
+        if target is None:
+            continue
+        images.append([target, waiting_labels.pop(0) if waiting_labels else None])
+        if images[-1][1] is None:
+            unlabelled.append(images[-1])
+    return [tuple(image) for image in images]
+
+def plan_docx_icn_images(docx_path):
+    """
+    Output names for the images of one DOCX, named after their ICN labels (see
+    pair_icn_images). Unlabelled images, and media not placed in the document body, are
+    named image_<n>. Returns [(media part name, file name, labelled)].
+    """
+    with zipfile.ZipFile(docx_path, "r") as zf:
+        media = {name for name in zf.namelist() if name.startswith("word/media/")}
+        image_targets = {
+            rId: target for rId, reltype, target, _ in read_part_rels(zf, "word/document.xml")
+            if reltype.endswith("/image") and target
+        }
+    images = pair_icn_images(scan_icn_text(docx_path), image_targets)
+    placed = {target for target, _ in images}
+    images += [(target, None) for target in sorted(media) if target not in placed]
     
-    for filename in os.listdir(input_dir):
-        if not filename.lower().endswith('.docx') or filename.startswith('~'):
+    plan = []
+    written_names = {}
+    written_targets = set()
+    unnamed = 0
+    for target, label in images:
+        if target not in media:
             continue
+        labelled = label is not None
+        if not labelled:
+            if target in written_targets:
+                continue
+            unnamed += 1
+            label = f"image_{unnamed}"
         
-        docx_path = os.path.join(input_dir, filename)
-        base_name = os.path.splitext(filename)[0]
-        doc_output_dir = os.path.join(output_dir, base_name)
+        name = re.sub(r'[<>:"/\\|?*]', '_', label)
+        if written_names.get(name) == target:
+            continue
+        stem, n = name, 1
+        while name in written_names:
+            n += 1
+            name = f"{stem}_{n}"
         
-        with zipfile.ZipFile(docx_path, 'r') as docx:
-            media_files = sorted([f for f in docx.namelist() if f.startswith('word/media/')])
-            if not media_files:
-                continue
-            
-            try:
-                xml_content = docx.read("word/document.xml")
-                plain_text = ""
+        written_names[name] = target
+        written_targets.add(target)
+        plan.append((target, f"{name}{os.path.splitext(target)[1]}", labelled))
+    return plan
+
+def list_docx_files(input_dir):
+    """Names of the DOCX files in input_dir that batch tools process (Word lock files skipped)."""
+    return [f for f in os.listdir(input_dir) if f.lower().endswith('.docx') and not f.startswith('~')]
+
+def document_pool(count):
+    """Process pool for per-document work: at most 4 workers, as for batch splitting."""
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=max(1, min(4, os.cpu_count() or 1, count)))
+
+# Raster formats normalize_image re-encodes; anything else (EMF, WMF, SVG...) is kept as is
+NORMALIZABLE_IMAGE_FORMATS = {'PNG', 'JPEG', 'MPO', 'BMP', 'DIB', 'TIFF', 'GIF', 'WEBP', 'PCX', 'TGA', 'ICO'}
+# Output format -> (Pillow format, extension); 'auto' keeps JPEG photos as JPEG, the rest PNG
+IMAGE_OUTPUT_FORMATS = {'png': ('PNG', '.png'), 'jpeg': ('JPEG', '.jpg')}
+IMAGE_FORMAT_CHOICES = ('auto',) + tuple(IMAGE_OUTPUT_FORMATS)
+IMAGE_CONTENT_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg'}
+
+def encode_image(image, pil_format, quality, icc_profile):
+    """Encode a Pillow image without its metadata, flattening transparency for JPEG."""
+    from PIL import Image
+    
+    if pil_format == 'JPEG':
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options = {'quality': quality, 'optimize': True, 'progressive': True}
+    else:
+        if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I;16'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        options = {'optimize': True}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+def normalize_image(data, options):
+    """
+    Re-encode one image for publishing. options: 'format' (see IMAGE_FORMAT_CHOICES),
+    'max_dimension' and 'thumbnail' (longest side in px, or None) and 'quality' (JPEG).
+    EXIF orientation is applied and all metadata but the colour profile dropped. Vector,
+    multi-frame (animated GIF/WebP, MPO) or unreadable images, and re-encodings that would
+    only grow a file without a format change or resize, come back as they were. A
+    thumbnail is only made when it is smaller than the image.
+    Returns {'data', 'ext' (None if unchanged), 'thumbnail', 'original_size', 'size'}.
+    """
+    from PIL import Image, ImageOps
+    
+    unchanged = {'data': data, 'ext': None, 'thumbnail': None, 'original_size': len(data), 'size': len(data)}
+    try:
+        image = Image.open(io.BytesIO(data))
+        source_format = image.format
+        if source_format not in NORMALIZABLE_IMAGE_FORMATS or getattr(image, 'n_frames', 1) > 1:
+            return unchanged
+        icc_profile = image.info.get('icc_profile') if image.mode != 'CMYK' else None
+        image = ImageOps.exif_transpose(image)
+        
+        choice = options.get('format', 'auto')
+        if choice == 'auto':
+            choice = 'jpeg' if source_format in ('JPEG', 'MPO') else 'png'
+        pil_format, ext = IMAGE_OUTPUT_FORMATS[choice]
+        
+        resized = False
+        max_dimension = options.get('max_dimension')
+        if max_dimension and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            resized = True
+        
+        quality = options.get('quality', 85)
+        encoded = encode_image(image, pil_format, quality, icc_profile)
+        result = {'data': encoded, 'ext': ext, 'thumbnail': None, 'original_size': len(data), 'size': len(encoded)}
+        if pil_format == source_format and not resized and len(encoded) >= len(data):
+            result = dict(unchanged)
+        
+        thumbnail_size = options.get('thumbnail')
+        if thumbnail_size and max(image.size) > thumbnail_size:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.Resampling.LANCZOS)
+            thumbnail = encode_image(thumbnail, pil_format, quality, icc_profile)
+            if len(thumbnail) < result['size']:
+                result['thumbnail'] = thumbnail
+        return result
+    except Exception as e:
+        print(f"Could not normalize image: {e}")
+        return unchanged
+
+def normalize_docx_icn_images(docx_path, image_options):
+    """
+    plan_docx_icn_images with every image read and re-encoded by normalize_image, for
+    running in a worker process. Returns [(media part name, file name, labelled, image)].
+    """
+    plan = plan_docx_icn_images(docx_path)
+    normalized = {}
+    images = []
+    with zipfile.ZipFile(docx_path, "r") as zf:
+        for target, name, labelled in plan:
+            if target not in normalized:
+                normalized[target] = normalize_image(zf.read(target), image_options)
+            image = normalized[target]
+            if image['ext']:
+                name = os.path.splitext(name)[0] + image['ext']
+            images.append((target, name, labelled, image))
+    return images
+
+ICN_LAYOUTS = ('dedup', 'folders')
+ICN_MANIFEST_FIELDS = ['document', 'image', 'label', 'blob', 'sha1', 'size', 'original_size', 'thumbnail']
+
+def write_icn_manifest(archive, rows):
+    """Add manifest.json and manifest.csv (document -> image -> blob) to the output archive."""
+    import csv
+    rows.sort(key=lambda row: (row['document'], row['order']))
+    rows = [{field: row[field] for field in ICN_MANIFEST_FIELDS} for row in rows]
+    archive.writestr("manifest.json", json.dumps(rows, indent=2))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ICN_MANIFEST_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    archive.writestr("manifest.csv", buffer.getvalue())
+
+def iter_extract_icn(input_dir, zip_path, layout='dedup', image_options=None):
+    """
+    Extract images with ICN tags from DOCX files straight into a ZIP archive at zip_path.
+    Documents are indexed in parallel worker processes; as each document completes, its
+    images are read from it and written to the archive with the same compression method
+    (zipfile cannot copy compressed data as is, so images are inflated and deflated
+    again). A document's images are only written once all of them could be read, so a
+    failed document leaves nothing behind. With image_options the workers also re-encode
+    the images (see normalize_image), and thumbnails, if asked for, go next to them under
+    thumbnails/.
+
+    With layout='dedup' every distinct image (by SHA-1 of its content) is stored once as
+    images/<sha1><ext>, across the whole batch; layout='folders' keeps one folder per
+    document with a full copy of each of its images (zip entries cannot share data).
+    Either way manifest.json/manifest.csv map each document's image names and ICN labels
+    to the stored blob, with its size before and after normalization.
+    Yields (filename, images written, images labelled, error) per document.
+    """
+    from concurrent.futures import as_completed
+    
+    if layout not in ICN_LAYOUTS:
+        raise ValueError(f"layout must be one of {', '.join(ICN_LAYOUTS)}")
+    
+    filenames = list_docx_files(input_dir)
+    manifest = []
+    stored = set()
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        if not filenames:
+            return
+        with document_pool(len(filenames)) as executor:
+            if image_options:
+                futures = {executor.submit(normalize_docx_icn_images, os.path.join(input_dir, f), image_options): f for f in filenames}
+            else:
+                futures = {executor.submit(plan_docx_icn_images, os.path.join(input_dir, f)): f for f in filenames}
+            for future in as_completed(futures):
+                filename = futures[future]
+                folder = os.path.splitext(filename)[0]
+                rows = []
+                blobs = {}  # blob name -> (data, compress type, thumbnail blob, thumbnail)
                 try:
-                    root = ET.fromstring(xml_content)
-                    ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-                    for t in root.findall('.//w:t', ns):
-                        if t.text:
-                            plain_text += t.text
-                except ET.ParseError:
-                    plain_text = xml_content.decode('utf-8', errors='ignore')
-                
-                icn_matches = re.findall(r'ICN-\s*([\w\-.]+)', plain_text)
-                icn_labels = [f"ICN-{match}" for match in icn_matches]
-                
-                if not os.path.exists(doc_output_dir):
-                    os.makedirs(doc_output_dir)
-                
-                for i, media_file in enumerate(media_files):
-                    if i < len(icn_labels):
-                        label = icn_labels[i]
-                    else:
-                        label = f"image_{i + 1}"
-                    
-                    ext = os.path.splitext(media_file)[1]
-                    safe_label = re.sub(r'[<>:"/\\|?*]', '_', label)
-                    out_path = os.path.join(doc_output_dir, f"{safe_label}{ext}")
-                    
-                    image_data = docx.read(media_file)
-                    with open(out_path, "wb") as out_file:
-                        out_file.write(image_data)
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                continue
+                    plan = future.result()
+                    with zipfile.ZipFile(os.path.join(input_dir, filename), 'r') as docx:
+                        for order, (target, name, labelled, *normalized) in enumerate(plan):
+                            info = docx.getinfo(target)
+                            compress_type = info.compress_type
+                            thumbnail = None
+                            if normalized:
+                                image = normalized[0]
+                                data, thumbnail = image['data'], image['thumbnail']
+                                if image['ext']:
+                                    compress_type = zipfile.ZIP_STORED
+                            else:
+                                data = docx.read(info)
+                            digest = hashlib.sha1(data).hexdigest()
+                            if layout == 'dedup':
+                                blob = f"images/{digest}{os.path.splitext(name)[1].lower()}"
+                                thumbnail_blob = f"thumbnails/{posixpath.basename(blob)}"
+                            else:
+                                blob = f"{folder}/{name}"
+                                thumbnail_blob = f"{folder}/thumbnails/{name}"
+                            if blob not in stored:
+                                blobs.setdefault(blob, (data, compress_type, thumbnail_blob, thumbnail))
+                            rows.append({
+                                'document': filename,
+                                'order': order,
+                                'image': name,
+                                'label': os.path.splitext(name)[0] if labelled else '',
+                                'blob': blob,
+                                'sha1': digest,
+                                'size': len(data),
+                                'original_size': info.file_size,
+                                'thumbnail': thumbnail_blob if thumbnail else '',
+                            })
+                except Exception as e:
+                    print(f"Error processing {filename}: {e}")
+                    yield filename, 0, 0, str(e)[:200]
+                    continue
+                for blob, (data, compress_type, thumbnail_blob, thumbnail) in blobs.items():
+                    archive.writestr(blob, data, compress_type=compress_type)
+                    if thumbnail:
+                        archive.writestr(thumbnail_blob, thumbnail, compress_type=zipfile.ZIP_STORED)
+                    stored.add(blob)
+                manifest.extend(rows)
+                yield filename, len(plan), sum(1 for _, _, labelled, *_ in plan if labelled), None
+        
+        write_icn_manifest(archive, manifest)
+
+def extract_icn_from_docx(input_dir, zip_path, layout='dedup', image_options=None):
+    """
+    Extract images with ICN tags from DOCX files straight into a ZIP archive at zip_path,
+    deduplicated or one folder per document (see iter_extract_icn).
+    """
+    for _ in iter_extract_icn(input_dir, zip_path, layout, image_options):
+        pass
 
 # ============================================================================
 # 6. ICN Maker/Generator
 # ============================================================================
 
+def icn_sequence_prefix(dmc_code, kpc, xyz):
+    """
+    The part of an ICN code before its SQ number (model/system/KPC/XYZ).
+    Raises ValueError when dmc_code is not a DMC code.
+    """
+    parts = dmc_code.split("-")
+    if len(parts) < 3:
+        raise ValueError(f"{dmc_code} is not a DMC code, so no ICN can be made for it")
+    return f"ICN-{parts[1]}-{parts[2]}-".lstrip('DMC-') + "".join(parts[3:-4]) + f"-{kpc}-{xyz}"
+
 def generate_icn_code(dmc_code, kpc, xyz, sq, icv, issue, sec):
     """Generate ICN code from DMC code."""
-    parts = dmc_code.split("-")
-    up_to_unit = f"ICN-{parts[1]}-{parts[2]}-".lstrip('DMC-') + "".join(parts[3:-4]) + f"-{kpc}-{xyz}-{sq}-{icv}-{issue}-{sec}"
-    return up_to_unit
+    return f"{icn_sequence_prefix(dmc_code, kpc, xyz)}-{sq}-{icv}-{issue}-{sec}"
+
+def icn_sequence_db(db_path):
+    """Open the ICN sequence database, creating its table on first use."""
+    import sqlite3
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS icn_sequences ("
+        "prefix TEXT PRIMARY KEY, next_sq INTEGER NOT NULL, updated TEXT NOT NULL)"
+    )
+    return conn
+
+def reserve_icn_sequences(db_path, counts, floor=1):
+    """
+    Atomically reserve a contiguous block of SQ numbers per ICN prefix, counts being
+    {prefix: numbers needed}. Blocks start at the prefix's next free number, or at floor
+    if that is higher. The whole job is reserved in one write transaction, so concurrent
+    jobs in other worker processes never get overlapping numbers.
+    Returns {prefix: first SQ of the block}.
+    """
+    conn = icn_sequence_db(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first_sqs = {}
+            for prefix, count in counts.items():
+                row = conn.execute("SELECT next_sq FROM icn_sequences WHERE prefix = ?", (prefix,)).fetchone()
+                first = max(row[0], floor) if row else floor
+                conn.execute(
+                    "INSERT OR REPLACE INTO icn_sequences (prefix, next_sq, updated) "
+                    "VALUES (?, ?, datetime('now'))",
+                    (prefix, first + count),
+                )
+                first_sqs[prefix] = first
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return first_sqs
+    finally:
+        conn.close()
 
-def paragraph_has_image(paragraph):
-    """Check if a paragraph contains an image."""
-    xml = paragraph._element.xml
-    return ("<w:drawing" in xml) or ("<w:pict" in xml) or ("<wp:inline" in xml)
+def list_icn_sequences(db_path, prefix=None):
+    """Next free SQ number per ICN prefix: [{'prefix', 'next_sq', 'updated'}]."""
+    if not os.path.exists(db_path):
+        return []
+    conn = icn_sequence_db(db_path)
+    try:
+        query = "SELECT prefix, next_sq, updated FROM icn_sequences"
+        args = ()
+        if prefix:
+            query += " WHERE prefix = ?"
+            args = (prefix,)
+        rows = conn.execute(query + " ORDER BY prefix", args).fetchall()
+    finally:
+        conn.close()
+    return [{'prefix': p, 'next_sq': n, 'updated': u} for p, n, u in rows]
+
+# Top-level paragraphs holding a drawing or VML picture, in document order; table cells
+# are included, paragraphs inside text boxes belong to the paragraph of their drawing
+ICN_IMAGE_PARAGRAPHS = etree.XPath(
+    "/w:document/w:body//w:p[not(ancestor::w:p)][.//w:drawing or .//w:pict]",
+    namespaces=NSMAP,
+)
+
+def icn_label_paragraph(icn):
+    """A plain paragraph holding the ICN label, as doc.add_paragraph(icn) would build it."""
+    paragraph = etree.Element(qn("w:p"))
+    run = etree.SubElement(paragraph, qn("w:r"))
+    etree.SubElement(run, qn("w:t")).text = icn
+    return paragraph
+
+def count_icn_image_paragraphs(docx_path):
+    """Number of paragraphs generate_icn_labels will label in one DOCX file."""
+    with zipfile.ZipFile(docx_path, "r") as zf:
+        return len(ICN_IMAGE_PARAGRAPHS(etree.fromstring(zf.read("word/document.xml"))))
+
+def rename_rels_targets(rels_xml, owner, renamed):
+    """Point the relationships of part owner at the new names of renamed parts."""
+    root = etree.fromstring(rels_xml)
+    base_dir = posixpath.dirname(owner)
+    for rel in root.iter(f"{{{RELS_NS}}}Relationship"):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External":
+            continue
+        if target.startswith("/"):
+            part = target.lstrip("/")
+        else:
+            part = posixpath.normpath(posixpath.join(base_dir, target))
+        if part in renamed:
+            old_name = posixpath.basename(part)
+            rel.set("Target", target[:len(target) - len(old_name)] + posixpath.basename(renamed[part]))
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+def rename_content_types(content_types, renamed):
+    """Content types with a Default for each new image extension and Overrides renamed."""
+    types = etree.fromstring(content_types)
+    defaults = {d.get("Extension", "").lower() for d in types.findall(f"{{{CONTENT_TYPES_NS}}}Default")}
+    for ext in sorted({posixpath.splitext(part)[1] for part in renamed.values()}):
+        if ext[1:] not in defaults:
+            default = etree.Element(f"{{{CONTENT_TYPES_NS}}}Default", Extension=ext[1:], ContentType=IMAGE_CONTENT_TYPES[ext])
+            types.insert(0, default)
+    for override in types.findall(f"{{{CONTENT_TYPES_NS}}}Override"):
+        part = override.get("PartName", "").lstrip("/")
+        if part in renamed:
+            override.set("PartName", f"/{renamed[part]}")
+            override.set("ContentType", IMAGE_CONTENT_TYPES[posixpath.splitext(renamed[part])[1]])
+    return etree.tostring(types, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+def label_docx_images(input_path, output_path, dmc_code, params, first_sq, image_options=None):
+    """
+    Insert an ICN label paragraph after every image paragraph of one DOCX file in a single
+    lxml pass over document.xml; the other parts are copied unchanged, except that with
+    image_options the images under word/media are re-encoded (see normalize_image) and
+    renamed, relationships included, when their format changes. SQ numbers start at
+    first_sq, zero-padded to the length of params['sq_start'].
+    Returns (image paragraphs, labels written, [{'image', 'file', 'original_size', 'size'}]).
+    """
+    pad_len = len(params['sq_start'])
+    with zipfile.ZipFile(input_path, "r") as zf:
+        root = etree.fromstring(zf.read("word/document.xml"))
+        
+        # The XPath result is a snapshot, so inserted labels are never revisited
+        image_paragraphs = ICN_IMAGE_PARAGRAPHS(root)
+        labelled = 0
+        for sq, paragraph in enumerate(image_paragraphs, first_sq):
+            icn = generate_icn_code(
+                dmc_code, params['kpc'], params['xyz'],
+                str(sq).zfill(pad_len), params['icv'],
+                params['issue'], params['sec']
+            )
+            if icn:
+                paragraph.addnext(icn_label_paragraph(icn))
+                labelled += 1
+        
+        media = {}
+        renamed = {}
+        if image_options:
+            for name in zf.namelist():
+                if name.startswith("word/media/"):
+                    media[name] = normalize_image(zf.read(name), image_options)
+                    stem, ext = posixpath.splitext(name)
+                    if media[name]['ext'] and media[name]['ext'] != ext.lower():
+                        renamed[name] = stem + media[name]['ext']
+        
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as out:
+            for info in zf.infolist():
+                name = info.filename
+                if name == "word/document.xml":
+                    data = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+                elif name in media:
+                    data = media[name]['data']
+                    if name in renamed:
+                        info = copy.copy(info)
+                        info.filename = renamed[name]
+                elif renamed and name.endswith(".rels"):
+                    directory, rels_name = posixpath.split(name)
+                    owner = posixpath.join(posixpath.dirname(directory), rels_name[:-len(".rels")])
+                    data = rename_rels_targets(zf.read(info), owner, renamed)
+                elif renamed and name == "[Content_Types].xml":
+                    data = rename_content_types(zf.read(info), renamed)
+                else:
+                    data = zf.read(info)
+                out.writestr(info, data, compress_type=info.compress_type)
+    
+    report = [
+        {'image': name, 'file': renamed.get(name, name), 'original_size': image['original_size'], 'size': image['size']}
+        for name, image in media.items()
+    ]
+    return len(image_paragraphs), labelled, report
 
-def generate_icn_labels(input_dir, output_dir, params):
-    """Generate ICN labels for images in DOCX files."""
-    os.makedirs(output_dir, exist_ok=True)
+ICN_IMAGE_REPORT_NAME = "image_report.json"
+
+def iter_generate_icn_labels(input_dir, output_dir, params, sequence_db=None, image_options=None):
+    """
+    Generate ICN labels for images in DOCX files, including images in table cells, in
+    parallel worker processes. SQ numbers run on from params['sq_start'] across the files,
+    in document order: image paragraphs are counted first so every file gets its SQ range
+    up front. With sequence_db, the ranges are instead reserved per ICN prefix in that
+    SQLite database (see reserve_icn_sequences), params['sq_start'] being the lowest SQ.
+    With image_options the embedded images are re-encoded too, and the size of each before
+    and after is written to image_report.json in output_dir.
+    Yields (filename, image paragraphs, labels written, error) per document.
+    """
+    from concurrent.futures import as_completed
     
-    current_sq = int(params['sq_start'])
-    pad_len = len(params['sq_start'])
+    os.makedirs(output_dir, exist_ok=True)
+    filenames = list_docx_files(input_dir)
+    if not filenames:
+        return
     
-    for filename in os.listdir(input_dir):
-        if not filename.lower().endswith('.docx') or filename.startswith('~'):
-            continue
-        
-        input_path = os.path.join(input_dir, filename)
-        dmc_code = os.path.splitext(filename)[0]
+    with document_pool(len(filenames)) as executor:
+        counts = [executor.submit(count_icn_image_paragraphs, os.path.join(input_dir, f)) for f in filenames]
         
-        doc = Document(input_path)
-        paragraphs = doc.paragraphs[:]
-        i = 0
+        # Each file's SQ block comes from one shared counter, or from its ICN prefix's
+        # block in the sequence database. Files without images need no prefix, so their
+        # names do not have to be DMC codes.
+        planned = []
+        needed = {}
+        for filename, count_future in zip(filenames, counts):
+            dmc_code = os.path.splitext(filename)[0]
+            try:
+                count = count_future.result()
+                prefix = None
+                if sequence_db and count:
+                    prefix = icn_sequence_prefix(dmc_code, params['kpc'], params['xyz'])
+            except Exception as e:
+                yield filename, 0, 0, str(e)[:200]
+                continue
+            planned.append((filename, dmc_code, prefix, count))
+            needed[prefix] = needed.get(prefix, 0) + count
+        next_sq = {None: int(params['sq_start'])}
+        if sequence_db:
+            needed.pop(None, None)
+            next_sq.update(reserve_icn_sequences(sequence_db, needed, int(params['sq_start'])))
         
-        while i < len(paragraphs):
-            para = paragraphs[i]
-            has_image = paragraph_has_image(para)
-            
-            if has_image:
-                icn = generate_icn_code(
-                    dmc_code, params['kpc'], params['xyz'],
-                    str(current_sq).zfill(pad_len), params['icv'],
-                    params['issue'], params['sec']
-                )
-                current_sq += 1
-                if icn:
-                    para._p.addnext(doc.add_paragraph(icn)._p)
-                    paragraphs = doc.paragraphs[:]
-                    i += 1
-            i += 1
+        futures = {}
+        for filename, dmc_code, prefix, count in planned:
+            input_path = os.path.join(input_dir, filename)
+            output_path = os.path.join(output_dir, filename)
+            futures[executor.submit(label_docx_images, input_path, output_path, dmc_code, params, next_sq[prefix], image_options)] = filename
+            next_sq[prefix] += count
         
-        output_path = os.path.join(output_dir, filename)
-        doc.save(output_path)
+        image_report = []
+        for future in as_completed(futures):
+            try:
+                images, labelled, report = future.result()
+            except Exception as e:
+                yield futures[future], 0, 0, str(e)[:200]
+                continue
+            image_report.extend({'document': futures[future], **row} for row in report)
+            yield futures[future], images, labelled, None
+    
+    if image_options:
+        image_report.sort(key=lambda row: (row['document'], row['image']))
+        with open(os.path.join(output_dir, ICN_IMAGE_REPORT_NAME), 'w', encoding='utf-8') as f:
+            json.dump(image_report, f, indent=2)
+
+def generate_icn_labels(input_dir, output_dir, params, sequence_db=None, image_options=None):
+    """
+    Generate ICN labels for images in DOCX files (see iter_generate_icn_labels).
+    Returns (documents labelled, [(filename, error)] for the documents that failed).
+    """
+    done, failed = 0, []
+    for filename, _, _, error in iter_generate_icn_labels(input_dir, output_dir, params, sequence_db, image_options):
+        if error:
+            failed.append((filename, error))
+        else:
+            done += 1
+    return done, failed
 
 # ============================================================================
 # 7. ICN Validator
 # ============================================================================
 
+ADOC_IMAGE_PATTERN = re.compile(r'image:?:?(.+?)\[', re.IGNORECASE)
+
+VALIDATION_BATCH = 64
+VALIDATION_IN_FLIGHT = 8  # batches queued at once: two for each of up to 4 workers
+
+def scan_adoc_image_refs(adoc_path):
+    """Image references of one ADOC file, read line by line (a reference never spans lines)."""
+    referenced_images = set()
+    with open(adoc_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            for match in ADOC_IMAGE_PATTERN.findall(line):
+                referenced_images.add(match.strip())
+    return referenced_images
+
+def validate_adoc_file(adoc_path, images_dir):
+    """Check one ADOC file's image references against its DM folder in images_dir."""
+    adoc_file = os.path.basename(adoc_path)
+    dmc_name = os.path.splitext(adoc_file)[0]
+    image_folder_path = os.path.join(images_dir, dmc_name)
+    
+    # Extract referenced images from ADOC
+    try:
+        referenced_images = scan_adoc_image_refs(adoc_path)
+    except Exception as e:
+        return {
+            'file': adoc_file,
+            'error': str(e),
+            'missing': [],
+            'unused': []
+        }
+    
+    # List existing images
+    existing_images = set()
+    if os.path.isdir(image_folder_path):
+        for root, _, files in os.walk(image_folder_path):
+            for file in files:
+                if not file.startswith('.'):
+                    relative_path = os.path.join(root, file)
+                    relative_path = os.path.relpath(relative_path, image_folder_path)
+                    existing_images.add(relative_path.replace(os.path.sep, '/'))
+    
+    # Perform checks
+    missing_images = list(referenced_images - existing_images)
+    unused_images = list(existing_images - referenced_images)
+    
+    return {
+        'file': adoc_file,
+        'missing': missing_images,
+        'unused': unused_images,
+        'status': 'ok' if not missing_images and not unused_images else 'warning'
+    }
+
+def run_in_batches(batch_fn, paths, *args):
+    """
+    Run batch_fn(batch, *args) over paths in parallel worker processes, yielding each item
+    of the returned lists as its batch completes. Paths go to the workers in batches of
+    VALIDATION_BATCH, at most VALIDATION_IN_FLIGHT at a time, so memory stays
+    flat however many files there are.
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    
+    if not paths:
+        return
+    batches = (paths[i:i + VALIDATION_BATCH] for i in range(0, len(paths), VALIDATION_BATCH))
+    with document_pool(-(-len(paths) // VALIDATION_BATCH)) as executor:
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(batch_fn, batch, *args))
+            if len(pending) < VALIDATION_IN_FLIGHT:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+        for future in wait(pending).done:
+            yield from future.result()
+
+def validate_adoc_batch(adoc_paths, images_dir):
+    """validate_adoc_file over a batch of files, run in a worker process."""
+    return [validate_adoc_file(path, images_dir) for path in adoc_paths]
+
+def iter_validate_adoc_images(adoc_dir, images_dir):
+    """
+    Validate ADOC image references against actual image files in parallel worker
+    processes, yielding one result per ADOC file as its batch completes.
+    """
+    adoc_paths = [os.path.join(adoc_dir, f) for f in os.listdir(adoc_dir) if f.endswith('.adoc')]
+    yield from run_in_batches(validate_adoc_batch, adoc_paths, images_dir)
+
 def validate_adoc_images(adoc_dir, images_dir):
     """Validate ADOC image references against actual image files."""
-    IMAGE_PATTERN = re.compile(r'image:?:?(.+?)\[', re.IGNORECASE)
+    order = {f: i for i, f in enumerate(os.listdir(adoc_dir))}
+    return sorted(iter_validate_adoc_images(adoc_dir, images_dir), key=lambda result: order[result['file']])
+
+# Elements whose infoEntityIdent names an ICN in an S1000D data module
+DM_ICN_TAGS = ('graphic', 'symbol')
+
+def scan_dm_icn_refs(xml_path):
+    """
+    ICN references of one S1000D data module in a streaming lxml pass that only
+    materialises graphic/symbol elements: the infoEntityIdent values in document order,
+    and the ENTITY declarations of the internal DTD ({name: system file}).
+    """
+    icns = []
+    context = etree.iterparse(
+        xml_path, events=("end",), tag=DM_ICN_TAGS,
+        resolve_entities=False, load_dtd=False, no_network=True, huge_tree=True,
+    )
+    for _, element in context:
+        icn = element.get("infoEntityIdent")
+        if icn:
+            icns.append(icn)
+        element.clear(keep_tail=True)
+    dtd = context.root.getroottree().docinfo.internalDTD if context.root is not None else None
+    entities = {entity.name: entity.system_url for entity in dtd.iterentities()} if dtd is not None else {}
+    return icns, entities
+
+def scan_dm_batch(xml_paths):
+    """scan_dm_icn_refs over a batch of data modules, run in a worker process."""
     results = []
-    
-    for adoc_file in os.listdir(adoc_dir):
-        if not adoc_file.endswith('.adoc'):
-            continue
-        
-        adoc_path = os.path.join(adoc_dir, adoc_file)
-        dmc_name = os.path.splitext(adoc_file)[0]
-        image_folder_path = os.path.join(images_dir, dmc_name)
-        
-        # Extract referenced images from ADOC
-        referenced_images = set()
+    for path in xml_paths:
         try:
-            with open(adoc_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                matches = IMAGE_PATTERN.findall(content)
-                for match in matches:
-                    referenced_images.add(match.strip())
+            icns, entities = scan_dm_icn_refs(path)
+            results.append((os.path.basename(path), icns, entities, None))
         except Exception as e:
-            results.append({
-                'file': adoc_file,
-                'error': str(e),
-                'missing': [],
-                'unused': []
-            })
+            results.append((os.path.basename(path), [], {}, str(e)))
+    return results
+
+def list_icn_images(images_dir):
+    """Image file names anywhere under images_dir (ICN file names are unique per project)."""
+    names = set()
+    for _, _, files in os.walk(images_dir):
+        names.update(file for file in files if not file.startswith('.'))
+    return names
+
+def iter_validate_dm_images(xml_dir, images_dir, referenced=None):
+    """
+    Validate the ICN references of S1000D XML data modules against the image files,
+    parsing the modules in parallel worker processes; yields one result per data module
+    as its batch completes. An ICN is missing when the file its ENTITY declares (or, if
+    undeclared, any file named after the ICN) is not among the images; 'undeclared' lists
+    references without an ENTITY declaration and 'unused' declarations nothing references.
+    If given, the set referenced collects every image file name the modules reference.
+    """
+    images = list_icn_images(images_dir)
+    by_stem = {}
+    for name in images:
+        by_stem.setdefault(os.path.splitext(name)[0], []).append(name)
+    xml_paths = [os.path.join(xml_dir, f) for f in os.listdir(xml_dir) if f.lower().endswith('.xml')]
+    
+    for xml_file, icns, entities, error in run_in_batches(scan_dm_batch, xml_paths):
+        if error:
+            yield {'file': xml_file, 'error': error, 'missing': [], 'unused': [], 'undeclared': []}
             continue
         
-        # List existing images
-        existing_images = set()
-        if os.path.isdir(image_folder_path):
-            for root, _, files in os.walk(image_folder_path):
-                for file in files:
-                    if not file.startswith('.'):
-                        relative_path = os.path.join(root, file)
-                        relative_path = os.path.relpath(relative_path, image_folder_path)
-                        existing_images.add(relative_path.replace(os.path.sep, '/'))
-        
-        # Perform checks
-        missing_images = list(referenced_images - existing_images)
-        unused_images = list(existing_images - referenced_images)
+        missing_images = []
+        undeclared = []
+        icn_set = set(icns)
+        for icn in dict.fromkeys(icns):
+            if icn in entities:
+                filename = posixpath.basename(entities[icn] or '')
+                found = filename in images
+                if found and referenced is not None:
+                    referenced.add(filename)
+            else:
+                undeclared.append(icn)
+                found = icn in by_stem
+                if found and referenced is not None:
+                    referenced.update(by_stem[icn])
+            if not found:
+                missing_images.append(icn)
+        unused = [name for name in entities if name not in icn_set]
         
+        yield {
+            'file': xml_file,
+            'missing': missing_images,
+            'unused': unused,
+            'undeclared': undeclared,
+            'status': 'ok' if not missing_images and not unused and not undeclared else 'warning'
+        }
+
+def validate_dm_images(xml_dir, images_dir):
+    """Validate S1000D data module ICN references against actual image files."""
+    order = {f: i for i, f in enumerate(os.listdir(xml_dir))}
+    return sorted(iter_validate_dm_images(xml_dir, images_dir), key=lambda result: order[result['file']])
+
+ICN_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS adoc_files (
+    name TEXT PRIMARY KEY, dm TEXT NOT NULL, mtime_ns INTEGER, size INTEGER, sha1 TEXT, error TEXT
+);
+CREATE TABLE IF NOT EXISTS adoc_refs (
+    name TEXT NOT NULL, dm TEXT NOT NULL, ref TEXT NOT NULL, PRIMARY KEY (name, ref)
+);
+CREATE TABLE IF NOT EXISTS images (
+    dm TEXT NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER, size INTEGER, sha1 TEXT,
+    PRIMARY KEY (dm, path)
+);
+CREATE INDEX IF NOT EXISTS adoc_refs_dm ON adoc_refs (dm, ref);
+"""
+
+def icn_catalog_db(db_path):
+    """Open an ICN catalog database, creating its tables on first use."""
+    import sqlite3
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(ICN_CATALOG_SCHEMA)
+    return conn
+
+def scan_image_folders(images_dir):
+    """Yield (dm, relative path, stat) for every image in the per-DM folders of images_dir."""
+    if not os.path.isdir(images_dir):
+        return
+    for dm_entry in os.scandir(images_dir):
+        if not dm_entry.is_dir():
+            continue
+        folder = dm_entry.path
+        for root, _, files in os.walk(folder):
+            for file in files:
+                if not file.startswith('.'):
+                    path = os.path.join(root, file)
+                    yield dm_entry.name, os.path.relpath(path, folder).replace(os.path.sep, '/'), os.stat(path)
+
+def sync_icn_catalog(db_path, adoc_dir, images_dir):
+    """
+    Bring the ICN catalog at db_path up to date with adoc_dir and images_dir. Only files
+    whose mtime or size changed are read again, and an ADOC file is only re-parsed when
+    its SHA-1 changed; rows of deleted files are dropped.
+    Returns {'adoc_parsed', 'images_hashed', 'removed'}.
+    """
+    conn = icn_catalog_db(db_path)
+    stats = {'adoc_parsed': 0, 'images_hashed': 0, 'removed': 0}
+    try:
+        with conn:
+            known = {name: (mtime, size, sha1) for name, mtime, size, sha1 in
+                     conn.execute("SELECT name, mtime_ns, size, sha1 FROM adoc_files")}
+            seen = set()
+            for adoc_file in os.listdir(adoc_dir) if os.path.isdir(adoc_dir) else []:
+                if not adoc_file.endswith('.adoc'):
+                    continue
+                seen.add(adoc_file)
+                adoc_path = os.path.join(adoc_dir, adoc_file)
+                st = os.stat(adoc_path)
+                row = known.get(adoc_file)
+                if row and row[:2] == (st.st_mtime_ns, st.st_size):
+                    continue
+                with open(adoc_path, 'rb') as f:
+                    data = f.read()
+                sha1 = hashlib.sha1(data).hexdigest()
+                if row and row[2] == sha1:
+                    conn.execute("UPDATE adoc_files SET mtime_ns = ?, size = ? WHERE name = ?",
+                                 (st.st_mtime_ns, st.st_size, adoc_file))
+                    continue
+                
+                dm = os.path.splitext(adoc_file)[0]
+                error = None
+                refs = set()
+                try:
+                    # Same newline handling as reading the file in text mode
+                    content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+                    refs = {match.strip() for match in ADOC_IMAGE_PATTERN.findall(content)}
+                except Exception as e:
+                    error = str(e)
+                conn.execute("DELETE FROM adoc_refs WHERE name = ?", (adoc_file,))
+                conn.executemany("INSERT INTO adoc_refs (name, dm, ref) VALUES (?, ?, ?)",
+                                 [(adoc_file, dm, ref) for ref in refs])
+                conn.execute("INSERT OR REPLACE INTO adoc_files VALUES (?, ?, ?, ?, ?, ?)",
+                             (adoc_file, dm, st.st_mtime_ns, st.st_size, sha1, error))
+                stats['adoc_parsed'] += 1
+            
+            gone = [(name,) for name in known if name not in seen]
+            conn.executemany("DELETE FROM adoc_refs WHERE name = ?", gone)
+            conn.executemany("DELETE FROM adoc_files WHERE name = ?", gone)
+            stats['removed'] += len(gone)
+            
+            known = {(dm, path): (mtime, size) for dm, path, mtime, size in
+                     conn.execute("SELECT dm, path, mtime_ns, size FROM images")}
+            seen = set()
+            for dm, path, st in scan_image_folders(images_dir):
+                seen.add((dm, path))
+                if known.get((dm, path)) == (st.st_mtime_ns, st.st_size):
+                    continue
+                sha1 = file_sha1(os.path.join(images_dir, dm, path))
+                conn.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)",
+                             (dm, path, st.st_mtime_ns, st.st_size, sha1))
+                stats['images_hashed'] += 1
+            
+            gone = [key for key in known if key not in seen]
+            conn.executemany("DELETE FROM images WHERE dm = ? AND path = ?", gone)
+            stats['removed'] += len(gone)
+    finally:
+        conn.close()
+    return stats
+
+def validate_icn_catalog(db_path):
+    """
+    Validate ADOC image references from the ICN catalog alone, with the same checks and
+    result format as validate_adoc_images: missing and unused images are set queries.
+    """
+    conn = icn_catalog_db(db_path)
+    try:
+        files = conn.execute("SELECT name, error FROM adoc_files ORDER BY name").fetchall()
+        missing = conn.execute(
+            "SELECT r.name, r.ref FROM adoc_refs r WHERE NOT EXISTS "
+            "(SELECT 1 FROM images i WHERE i.dm = r.dm AND i.path = r.ref)"
+        ).fetchall()
+        unused = conn.execute(
+            "SELECT a.name, i.path FROM adoc_files a JOIN images i ON i.dm = a.dm "
+            "WHERE a.error IS NULL AND NOT EXISTS "
+            "(SELECT 1 FROM adoc_refs r WHERE r.name = a.name AND r.ref = i.path)"
+        ).fetchall()
+    finally:
+        conn.close()
+    
+    missing_by_file = {}
+    for name, ref in missing:
+        missing_by_file.setdefault(name, []).append(ref)
+    unused_by_file = {}
+    for name, path in unused:
+        unused_by_file.setdefault(name, []).append(path)
+    
+    results = []
+    for name, error in files:
+        if error is not None:
+            results.append({'file': name, 'error': error, 'missing': [], 'unused': []})
+            continue
+        missing_images = missing_by_file.get(name, [])
+        unused_images = unused_by_file.get(name, [])
         results.append({
-            'file': adoc_file,
+            'file': name,
             'missing': missing_images,
             'unused': unused_images,
             'status': 'ok' if not missing_images and not unused_images else 'warning'
         })
-    
     return results
 
 # ============================================================================
@@ -0,0 +1,40 @@
+import io
+import os
+import struct
+import sys
+import zlib
+
+import pytest
+from docx import Document
+from docx.shared import Inches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def png_bytes(width=1, height=1, rgb=(255, 0, 0)):
+    """A minimal RGB PNG, distinct per colour, without needing Pillow."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    row = b"\x00" + bytes(rgb) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+@pytest.fixture
+def make_docx(tmp_path):
+    """Build a DOCX from a list of blocks: ('image', rgb) or ('text', str)."""
+    def build(blocks, name="DMC-TEST-A-00-00-00-00A-040A-A.docx"):
+        doc = Document()
+        for kind, value in blocks:
+            if kind == "image":
+                doc.add_picture(io.BytesIO(png_bytes(rgb=value)), width=Inches(1))
+            else:
+                doc.add_paragraph(value)
+        path = tmp_path / name
+        doc.save(path)
+        return path
+    return build
@@ -0,0 +1,70 @@
+import json
+import shutil
+import zipfile
+
+from converters import iter_extract_icn
+
+BLOCKS = [
+    ("image", (255, 0, 0)),
+    ("text", "ICN-TEST-A-00001-A-001-01"),
+    ("image", (0, 255, 0)),
+    ("text", "ICN-TEST-A-00002-A-001-01"),
+]
+
+
+def corrupt_entry(docx_path, name):
+    """Flip a byte inside the stored data of one zip entry, so reading it fails its CRC."""
+    with zipfile.ZipFile(docx_path) as zf:
+        info = zf.getinfo(name)
+    with open(docx_path, "r+b") as f:
+        f.seek(info.header_offset + 26)
+        name_len = int.from_bytes(f.read(2), "little")
+        extra_len = int.from_bytes(f.read(2), "little")
+        f.seek(info.header_offset + 30 + name_len + extra_len + info.compress_size // 2)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def read_manifest(zip_path):
+    with zipfile.ZipFile(zip_path) as zf:
+        return zf.namelist(), json.loads(zf.read("manifest.json"))
+
+
+def test_dedup_stores_each_image_once(make_docx, tmp_path):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    source = make_docx(BLOCKS)
+    shutil.copy(source, input_dir / "a.docx")
+    shutil.copy(source, input_dir / "b.docx")
+
+    zip_path = tmp_path / "out.zip"
+    results = list(iter_extract_icn(str(input_dir), str(zip_path)))
+    assert all(error is None for *_, error in results)
+
+    names, manifest = read_manifest(zip_path)
+    assert len([n for n in names if n.startswith("images/")]) == 2
+    assert len(manifest) == 4
+    assert {row["blob"] for row in manifest} == {n for n in names if n.startswith("images/")}
+
+
+def test_failed_document_leaves_nothing_behind(make_docx, tmp_path):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    good = make_docx(BLOCKS, name="good.docx")
+    shutil.copy(good, input_dir / "good.docx")
+    bad = make_docx([("image", (0, 0, 255)), ("text", "x"), ("image", (9, 9, 9))], name="bad.docx")
+    with zipfile.ZipFile(bad) as zf:
+        media = sorted(n for n in zf.namelist() if n.startswith("word/media/"))
+    corrupt_entry(bad, media[-1])
+    shutil.copy(bad, input_dir / "bad.docx")
+
+    for layout in ("dedup", "folders"):
+        zip_path = tmp_path / f"{layout}.zip"
+        errors = {name: error for name, _, _, error in iter_extract_icn(str(input_dir), str(zip_path), layout)}
+        assert errors["good.docx"] is None and errors["bad.docx"]
+
+        names, manifest = read_manifest(zip_path)
+        blobs = {n for n in names if not n.startswith("manifest.")}
+        assert {row["document"] for row in manifest} == {"good.docx"}
+        assert blobs == {row["blob"] for row in manifest}
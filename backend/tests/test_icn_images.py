@@ -0,0 +1,96 @@
+import io
+import zipfile
+
+import pytest
+from docx import Document
+from docx.shared import Inches
+from lxml import etree
+
+from converters import label_docx_images, normalize_image
+
+Image = pytest.importorskip("PIL.Image")
+
+PARAMS = {"kpc": "1", "xyz": "1671Y", "sq_start": "00005", "icv": "A", "issue": "001", "sec": "01"}
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def image_bytes(pil_format, size=(40, 30), color=(0, 128, 255)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, pil_format)
+    return buffer.getvalue()
+
+
+def rename_part(docx_path, old, new, override_type=None):
+    """Rename a media part by hand, as Word would have named it, with an Override if asked."""
+    with zipfile.ZipFile(docx_path) as zf:
+        entries = [(info.filename, zf.read(info)) for info in zf.infolist()]
+    old_ext, new_ext = old.rsplit(".", 1)[1], new.rsplit(".", 1)[1]
+    with zipfile.ZipFile(docx_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries:
+            if name == old:
+                name = new
+            elif name == "word/_rels/document.xml.rels":
+                data = data.replace(old.split("/", 1)[1].encode(), new.split("/", 1)[1].encode())
+            elif name == "[Content_Types].xml":
+                types = etree.fromstring(data)
+                for default in types.findall(f"{{{CONTENT_TYPES_NS}}}Default"):
+                    if default.get("Extension") == old_ext:
+                        default.set("Extension", new_ext)
+                if override_type:
+                    etree.SubElement(types, f"{{{CONTENT_TYPES_NS}}}Override", PartName=f"/{new}", ContentType=override_type)
+                data = etree.tostring(types, xml_declaration=True, encoding="UTF-8", standalone=True)
+            zf.writestr(name, data)
+
+
+def test_label_renames_media_with_rels_and_content_types(tmp_path):
+    doc = Document()
+    doc.add_picture(io.BytesIO(image_bytes("BMP")), width=Inches(1))
+    doc.add_picture(io.BytesIO(image_bytes("JPEG", color=(200, 10, 10))), width=Inches(1))
+    source = tmp_path / "DMC-TEST-A-00-00-00-00A-040A-A.docx"
+    doc.save(source)
+    rename_part(source, "word/media/image2.jpg", "word/media/image2.jpeg", override_type="image/jpeg")
+
+    output = tmp_path / "out.docx"
+    paragraphs, labelled, report = label_docx_images(source, output, "DMC-TEST-A-00-00-00-00A-040A-A", PARAMS, 5, {"format": "auto"})
+
+    assert (paragraphs, labelled) == (2, 2)
+    assert {row["image"]: row["file"] for row in report} == {
+        "word/media/image1.bmp": "word/media/image1.png",
+        "word/media/image2.jpeg": "word/media/image2.jpg",
+    }
+    with zipfile.ZipFile(output) as zf:
+        names = set(zf.namelist())
+        rels = etree.fromstring(zf.read("word/_rels/document.xml.rels"))
+        types = etree.fromstring(zf.read("[Content_Types].xml"))
+    assert {"word/media/image1.png", "word/media/image2.jpg"} <= names
+    assert not {"word/media/image1.bmp", "word/media/image2.jpeg"} & names
+    targets = {rel.get("Target") for rel in rels.iter(f"{{{RELS_NS}}}Relationship")}
+    assert {"media/image1.png", "media/image2.jpg"} <= targets
+    defaults = {d.get("Extension"): d.get("ContentType") for d in types.findall(f"{{{CONTENT_TYPES_NS}}}Default")}
+    assert defaults["png"] == "image/png" and defaults["jpg"] == "image/jpeg"
+    overrides = {o.get("PartName") for o in types.findall(f"{{{CONTENT_TYPES_NS}}}Override")}
+    assert "/word/media/image2.jpg" in overrides and "/word/media/image2.jpeg" not in overrides
+
+    # The package still opens and every picture resolves to its renamed part
+    reopened = Document(output)
+    parts = {rel.target_part.partname for rel in reopened.part.rels.values() if rel.reltype.endswith("/image")}
+    assert parts == {"/word/media/image1.png", "/word/media/image2.jpg"}
+
+
+def test_animated_gif_is_kept():
+    frames = [Image.new("RGB", (20, 20), color) for color in ((255, 0, 0), (0, 255, 0))]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:], duration=100)
+    data = buffer.getvalue()
+
+    result = normalize_image(data, {"format": "png", "thumbnail": 8})
+    assert result["data"] == data and result["ext"] is None and result["thumbnail"] is None
+
+
+def test_thumbnail_only_when_smaller():
+    small = normalize_image(image_bytes("PNG", size=(16, 16)), {"format": "auto", "thumbnail": 64})
+    assert small["thumbnail"] is None
+
+    large = normalize_image(image_bytes("PNG", size=(400, 300)), {"format": "auto", "thumbnail": 64})
+    assert Image.open(io.BytesIO(large["thumbnail"])).size == (64, 48)
@@ -0,0 +1,73 @@
+import zipfile
+
+from lxml import etree
+
+from converters import NSMAP, plan_docx_icn_images, scan_icn_text
+
+W = NSMAP["w"]
+WPS = "http://schemas.microsoft.com/office/word/2010/wordprocessingShape"
+
+
+def text_box_paragraph(caption):
+    """A paragraph holding a text box, as Word saves it: DrawingML choice plus VML fallback."""
+    xml = f"""
+    <w:p xmlns:w="{W}" xmlns:mc="{NSMAP['mc']}" xmlns:v="{NSMAP['v']}" xmlns:wps="{WPS}"
+         xmlns:a="{NSMAP['a']}" xmlns:wp="{NSMAP['wp']}">
+      <w:r><mc:AlternateContent>
+        <mc:Choice Requires="wps"><w:drawing><wp:anchor><a:graphic><a:graphicData>
+          <wps:wsp><wps:txbx><w:txbxContent>
+            <w:p><w:r><w:t>{caption}</w:t></w:r></w:p>
+          </w:txbxContent></wps:txbx></wps:wsp>
+        </a:graphicData></a:graphic></wp:anchor></w:drawing></mc:Choice>
+        <mc:Fallback><w:pict><v:rect><v:textbox><w:txbxContent>
+          <w:p><w:r><w:t>{caption}</w:t></w:r></w:p>
+        </w:txbxContent></v:textbox></v:rect></w:pict></mc:Fallback>
+      </mc:AlternateContent></w:r>
+    </w:p>"""
+    return etree.fromstring(xml)
+
+
+def replace_placeholder(docx_path, placeholder, new_paragraph):
+    with zipfile.ZipFile(docx_path) as zf:
+        parts = {info.filename: zf.read(info) for info in zf.infolist()}
+    root = etree.fromstring(parts["word/document.xml"])
+    for t in root.iter(f"{{{W}}}t"):
+        if t.text == placeholder:
+            paragraph = next(a for a in t.iterancestors() if a.tag == f"{{{W}}}p")
+            paragraph.getparent().replace(paragraph, new_paragraph)
+            break
+    parts["word/document.xml"] = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    with zipfile.ZipFile(docx_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+
+def test_text_box_caption_is_counted_once(make_docx):
+    path = make_docx([
+        ("image", (255, 0, 0)),
+        ("text", "PLACEHOLDER"),
+        ("image", (0, 255, 0)),
+        ("text", "ICN-TEST-A-00002-A-001-01"),
+    ])
+    replace_placeholder(path, "PLACEHOLDER", text_box_paragraph("ICN-TEST-A-00001-A-001-01"))
+
+    scan = scan_icn_text(path)
+    assert [label["label"] for label in scan["labels"]] == [
+        "ICN-TEST-A-00001-A-001-01",
+        "ICN-TEST-A-00002-A-001-01",
+    ]
+    assert len(scan["images"]) == 2
+
+    names = [name for _, name, labelled in plan_docx_icn_images(path) if labelled]
+    assert names == ["ICN-TEST-A-00001-A-001-01.png", "ICN-TEST-A-00002-A-001-01.png"]
+
+
+def test_caption_above_figure_waits_for_next_image(make_docx):
+    path = make_docx([
+        ("text", "ICN-TEST-A-00001-A-001-01"),
+        ("image", (255, 0, 0)),
+        ("image", (0, 0, 255)),
+        ("text", "ICN-TEST-A-00002-A-001-01"),
+    ])
+    names = [name for _, name, _ in plan_docx_icn_images(path)]
+    assert names == ["ICN-TEST-A-00001-A-001-01.png", "ICN-TEST-A-00002-A-001-01.png"]
@@ -0,0 +1,56 @@
+import multiprocessing
+
+from converters import generate_icn_labels, list_icn_sequences, reserve_icn_sequences
+
+PREFIXES = ("ICN-TEST-A-1-1671Y", "ICN-TEST-B-1-1671Y")
+PARAMS = {"kpc": "1", "xyz": "1671Y", "sq_start": "00005", "icv": "A", "issue": "001", "sec": "01"}
+
+
+def reserve_many(db_path, rounds, queue):
+    """Reserve blocks of varying size in a loop and report (prefix, first, count) for each."""
+    blocks = []
+    for n in range(rounds):
+        counts = {prefix: 1 + (n + i) % 4 for i, prefix in enumerate(PREFIXES)}
+        for prefix, first in reserve_icn_sequences(db_path, counts, floor=5).items():
+            blocks.append((prefix, first, counts[prefix]))
+    queue.put(blocks)
+
+
+def test_concurrent_reservations_never_overlap(tmp_path):
+    db_path = str(tmp_path / "icn_sequences.db")
+    reserve_icn_sequences(db_path, {}, floor=5)  # create the database before the race
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [context.Process(target=reserve_many, args=(db_path, 40, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    blocks = [block for _ in workers for block in queue.get(timeout=60)]
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    for prefix in PREFIXES:
+        ranges = sorted((first, first + count) for p, first, count in blocks if p == prefix)
+        assert ranges[0][0] == 5
+        # Blocks are contiguous and disjoint: each starts where the previous one ended
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert start == end
+        next_sq = {row["prefix"]: row["next_sq"] for row in list_icn_sequences(db_path)}[prefix]
+        assert next_sq == ranges[-1][1]
+
+
+def test_non_dmc_names_fail_alone(make_docx, tmp_path):
+    make_docx([("image", (255, 0, 0))])
+    make_docx([("text", "No figures here")], name="notes.docx")
+    make_docx([("image", (0, 0, 255))], name="figures.docx")
+    output_dir = tmp_path / "out"
+    db_path = str(tmp_path / "icn_sequences.db")
+
+    done, failed = generate_icn_labels(str(tmp_path), str(output_dir), PARAMS, db_path)
+
+    # A name without images needs no ICN prefix; one with images fails on its own
+    assert done == 2
+    assert [name for name, _ in failed] == ["figures.docx"]
+    assert "not a DMC code" in failed[0][1]
+    assert sorted(p.name for p in output_dir.glob("*.docx")) == ["DMC-TEST-A-00-00-00-00A-040A-A.docx", "notes.docx"]
+    assert [row["prefix"] for row in list_icn_sequences(db_path)] == ["ICN-TEST-A-0000-1-1671Y"]
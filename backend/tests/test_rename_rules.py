@@ -0,0 +1,33 @@
+import json
+import zipfile
+
+import pytest
+
+from converters import RENAME_ERRORS_NAME, apply_rename_rules, compile_rename_rules, execute_rename_from_excel
+
+
+@pytest.mark.parametrize("template", ["{n.x}", "{name.upper}", "{n[0]}", "{0}", "{}", "{other}", "{n:{w}}", "{n!z}", "{n"])
+def test_sequence_format_rejects_anything_but_plain_fields(template):
+    with pytest.raises(ValueError):
+        compile_rename_rules([{"type": "sequence", "format": template}])
+
+
+def test_sequence_format_numbers_names():
+    compiled = compile_rename_rules([{"type": "sequence", "format": "{n}_{name}", "start": 5, "width": 3}])
+    assert apply_rename_rules("report.pdf", compiled, 2) == "007_report.pdf"
+
+
+def test_partial_rename_lists_failures_in_archive(tmp_path):
+    (tmp_path / "a.docx").write_bytes(b"a")
+    preview = [
+        {"original_name": "a.docx", "new_name": "DMC-A.docx", "status": "\u2713 ready"},
+        {"original_name": "gone.docx", "new_name": "DMC-B.docx", "status": "\u2713 ready"},
+    ]
+    zip_path = tmp_path / "out.zip"
+
+    count, errors = execute_rename_from_excel(str(tmp_path), preview, str(zip_path), ["a.docx", "gone.docx"])
+
+    assert count == 1 and len(errors) == 1 and "gone.docx" in errors[0]
+    with zipfile.ZipFile(zip_path) as zf:
+        assert set(zf.namelist()) == {"DMC-A.docx", RENAME_ERRORS_NAME}
+        assert json.loads(zf.read(RENAME_ERRORS_NAME)) == errors
@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+
+import converters
+from converters import (
+    batch_edit_distances,
+    build_suggestion_index,
+    edit_distance_to,
+    generate_rename_preview_from_excel,
+    load_excel_mapping,
+    normalize_mapping_key,
+    suggest_mapping_keys,
+)
+
+
+def levenshtein(a, b):
+    """Textbook dynamic programming distance, the reference for the bit-parallel one."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def test_edit_distance_matches_dynamic_programming():
+    rng = random.Random(1234)
+    for _ in range(2000):
+        alphabet = rng.choice(["ab", "abc", "abcdefghij", "0123456789-_ ABCxyz"])
+        # Lengths span the 64-bit boundary of the bit vectors
+        a = "".join(rng.choice(alphabet) for _ in range(rng.choice([rng.randint(0, 8), rng.randint(60, 70)])))
+        b = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 70)))
+        assert edit_distance_to(a)(b) == levenshtein(a, b), (a, b)
+
+
+def test_batch_edit_distances_match_dynamic_programming():
+    rng = random.Random(99)
+    alphabet = "abcdefghij0123456789."
+    # Keys and patterns on both sides of the 64 characters of a uint64 lane
+    keys = {"".join(rng.choice(alphabet) for _ in range(rng.choice([rng.randint(1, 10), rng.randint(55, 80)]))) for _ in range(300)}
+    index = build_suggestion_index({key: "DMC" for key in keys})
+    patterns = ["".join(rng.choice(alphabet + "xyz") for _ in range(rng.choice([rng.randint(0, 10), rng.randint(55, 80)]))) for _ in range(60)]
+    pattern_ids = np.array([rng.randrange(len(patterns)) for _ in range(3000)], dtype=np.int64)
+    key_ids = np.array([rng.randrange(len(keys)) for _ in range(3000)], dtype=np.int64)
+
+    distances = batch_edit_distances(patterns, pattern_ids, key_ids, index)
+    expected = [levenshtein(patterns[p], index["normalized"][k]) for p, k in zip(pattern_ids, key_ids)]
+    assert distances.tolist() == expected
+
+
+def test_suggestions_rank_by_edit_distance():
+    rng = random.Random(42)
+    mapping = {
+        f"Chapter {i:03d} {''.join(rng.choice('abcdefgh') for _ in range(12))}": f"DMC-{i:03d}"
+        for i in range(200)
+    }
+    index = build_suggestion_index(mapping)
+    keys = rng.sample(list(mapping), 20)
+    ranked = suggest_mapping_keys([key[:-2] + "zz" for key in keys], index, mapping)
+    for key, suggestions in zip(keys, ranked):
+        typo = key[:-2] + "zz"
+        assert suggestions[0]["doc_name"] == key
+        norm, best = normalize_mapping_key(typo), normalize_mapping_key(key)
+        expected = 1 - levenshtein(norm, best) / max(len(norm), len(best))
+        assert suggestions[0]["score"] == round(expected, 3)
+        assert [s["score"] for s in suggestions] == sorted((s["score"] for s in suggestions), reverse=True)
+
+
+def test_preview_builds_sheet_indexes_once(tmp_path, monkeypatch):
+    sheet = tmp_path / "mapping.csv"
+    sheet.write_text("Doc Name,DMC Code\nFuel Pump Removal,DMC-A-001\nFuel Pump Installation,DMC-A-002\n", encoding="utf-8")
+    files = ["fuel_pump_removal.docx", "Fuel Pump Instalation.docx"]
+
+    built = []
+    real_build = converters.build_suggestion_index
+    monkeypatch.setattr(converters, "build_suggestion_index", lambda mapping: built.append(1) or real_build(mapping))
+
+    first = generate_rename_preview_from_excel(str(sheet), None, files)
+    second = generate_rename_preview_from_excel(str(sheet), None, files)
+
+    assert first["preview"] == second["preview"]
+    assert len(built) == 1
+    assert "suggestion_index" in load_excel_mapping(str(sheet))
+    by_name = {item["original_name"]: item for item in first["preview"]}
+    assert by_name["fuel_pump_removal.docx"]["dmc_code"] == "DMC-A-001"
+    assert by_name["Fuel Pump Instalation.docx"]["available_matches"][0] == "fuel pump installation"
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+from docx import Document
+
+from converters import split_docx_by_heading_v2, split_docx_streaming
+
+LEVELS = ["Heading 1", "Heading 2", "Heading 3"]
+
+
+@pytest.fixture
+def outline_docx(tmp_path):
+    """Chapters with skipped heading levels, a table and a page header."""
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Running header"
+    doc.add_paragraph("Front matter")
+    doc.add_heading("Ch1", 1)
+    doc.add_paragraph("Chapter one intro")
+    doc.add_heading("Deep before any section", 3)  # H1 -> H3, a later H2 makes it a section
+    doc.add_paragraph("Deep text")
+    doc.add_heading("Sec 1.1", 2)
+    doc.add_paragraph("Section text")
+    doc.add_heading("Sub 1.1.1", 3)
+    doc.add_table(rows=1, cols=2).cell(0, 0).text = "cell"
+    doc.add_heading("Ch2", 1)
+    doc.add_heading("Only deep", 3)  # no H2 in this chapter: stays body content
+    doc.add_paragraph("Chapter two text")
+    path = tmp_path / "outline.docx"
+    doc.save(path)
+    return path
+
+
+def output_tree(root):
+    """Relative path -> paragraph texts of every document under root."""
+    tree = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.path.sep, "/")
+            tree[relative] = [p.text for p in Document(path).paragraphs]
+    return tree
+
+
+@pytest.mark.parametrize("heading_style", ["Heading 1", LEVELS])
+def test_streaming_matches_v2(outline_docx, tmp_path, heading_style):
+    v2_dir, streaming_dir = tmp_path / "v2", tmp_path / "streaming"
+    progress = []
+
+    v2_count = split_docx_by_heading_v2(str(outline_docx), str(v2_dir), heading_style)
+    streaming_count = split_docx_streaming(
+        str(outline_docx), str(streaming_dir), heading_style, lambda *event: progress.append(event)
+    )
+
+    assert streaming_count == v2_count
+    assert output_tree(streaming_dir) == output_tree(v2_dir)
+    # The plan is made up front, so the total is known from the first event
+    assert progress[0] == (0, v2_count, None)
+    assert [current for current, _, _ in progress] == list(range(v2_count + 1))
+
+
+def test_skipped_level_nests_like_v2(outline_docx, tmp_path):
+    split_docx_streaming(str(outline_docx), str(tmp_path / "out"), LEVELS)
+    tree = output_tree(tmp_path / "out")
+    assert tree["02_Ch1/01_Ch1/01_Ch1.docx"] == ["Ch1", "Chapter one intro"]
+    assert tree["02_Ch1/01_Ch1/02_Deep before any section.docx"] == ["Deep before any section", "Deep text"]
+    assert tree["03_Ch2.docx"] == ["Ch2", "Only deep", "Chapter two text"]
@@ -13,7 +13,7 @@ export default function ExcelRenamerPage() {
   const [docxFiles, setDocxFiles] = useState([])
   const [previewData, setPreviewData] = useState(null)
   const [excelData, setExcelData] = useState(null)
-  const [tempDir, setTempDir] = useState(null)
+  const [sessionId, setSessionId] = useState(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
   const [showModal, setShowModal] = useState(false)
@@ -56,7 +56,7 @@ export default function ExcelRenamerPage() {
 
       setPreviewData(response.data.preview)
       setExcelData(response.data.excel_data)
-      setTempDir(response.data.temp_dir)
+      setSessionId(response.data.session_id)
       setShowModal(true)
       addLog('Preview generated successfully', 'success')
     } catch (err) {
@@ -69,7 +69,7 @@ export default function ExcelRenamerPage() {
   }
 
   const handleExecute = async () => {
-    if (!previewData || !tempDir) return
+    if (!previewData || !sessionId) return
 
     setLoading(true)
     setError(null)
@@ -77,8 +77,7 @@ export default function ExcelRenamerPage() {
 
     try {
       const response = await axios.post('/api/rename-execute', {
-        temp_dir: tempDir,
-        preview_data: previewData
+        session_id: sessionId
       }, {
         responseType: 'blob'
       })
@@ -94,7 +93,7 @@ export default function ExcelRenamerPage() {
       setExcelFile(null)
       setDocxFiles([])
       setPreviewData(null)
-      setTempDir(null)
+      setSessionId(null)
       addLog(`Successfully renamed files`, 'success')
     } catch (err) {
       const errorMsg = 'Rename execution failed'
@@ -141,7 +140,7 @@ export default function ExcelRenamerPage() {
         <CardHeader>
           <CardTitle className="flex items-center gap-2">
             <FileSpreadsheet className="h-5 w-5" />
-            Step 1: Upload Excel Mapping File (.xlsx or .xls)
+            Step 1: Upload Excel Mapping File (.xlsx, .xls or .csv)
           </CardTitle>
           <CardDescription>
             Excel file should contain: <strong>"Doc Name"</strong> (original filename without .docx)
@@ -154,7 +153,8 @@ export default function ExcelRenamerPage() {
               onDrop={onDropExcel}
               accept={{
                 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
-                'application/vnd.ms-excel': ['.xls']
+                'application/vnd.ms-excel': ['.xls'],
+                'text/csv': ['.csv']
               }}
               multiple={false}
             >
@@ -11,6 +11,8 @@ export default function IcnExtractorPage() {
   const [files, setFiles] = useState([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
+  const [layout, setLayout] = useState('dedup')
+  const [imageFormat, setImageFormat] = useState('')
 
   const onDrop = useCallback((acceptedFiles) => {
     setFiles(acceptedFiles)
@@ -40,6 +42,11 @@ export default function IcnExtractorPage() {
     files.forEach(file => {
       formData.append('files', file)
     })
+    formData.append('layout', layout)
+    if (imageFormat) {
+      formData.append('normalize_images', 'true')
+      formData.append('image_format', imageFormat)
+    }
 
     try {
       const response = await axios.post('/api/extract-icn', formData, {
@@ -79,7 +86,7 @@ export default function IcnExtractorPage() {
         <CardHeader>
           <CardTitle>Extract ICN Images</CardTitle>
           <CardDescription>
-            Extract images from DOCX files with ICN tags. Images will be organized by document name and labeled with their ICN codes.
+            Extract images from DOCX files with ICN tags. Images are labeled with their ICN codes; a manifest maps each document's images to the files in the archive.
           </CardDescription>
         </CardHeader>
         <CardContent className="space-y-6">
@@ -98,6 +105,32 @@ export default function IcnExtractorPage() {
             </p>
           </div>
 
+          <div className="space-y-2">
+            <label className="text-sm font-medium">Archive layout:</label>
+            <select
+              value={layout}
+              onChange={(e) => setLayout(e.target.value)}
+              className="w-full p-2 bg-secondary border border-border rounded-md text-foreground"
+            >
+              <option value="dedup">Deduplicated - each distinct image stored once</option>
+              <option value="folders">One folder per document</option>
+            </select>
+          </div>
+
+          <div className="space-y-2">
+            <label className="text-sm font-medium">Image optimisation:</label>
+            <select
+              value={imageFormat}
+              onChange={(e) => setImageFormat(e.target.value)}
+              className="w-full p-2 bg-secondary border border-border rounded-md text-foreground"
+            >
+              <option value="">Off - keep images as embedded</option>
+              <option value="auto">Auto - JPEG stays JPEG, others PNG (max 2000px)</option>
+              <option value="png">PNG (max 2000px)</option>
+              <option value="jpeg">JPEG (max 2000px)</option>
+            </select>
+          </div>
+
           {files.length > 0 && (
             <div className="space-y-2">
               <div className="flex items-center justify-between">
@@ -19,6 +19,7 @@ export default function IcnMakerPage() {
   })
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
+  const [imageFormat, setImageFormat] = useState('')
 
   const onDrop = useCallback((acceptedFiles) => {
     setFiles(acceptedFiles)
@@ -55,6 +56,10 @@ export default function IcnMakerPage() {
     Object.keys(params).forEach(key => {
       formData.append(key, params[key])
     })
+    if (imageFormat) {
+      formData.append('normalize_images', 'true')
+      formData.append('image_format', imageFormat)
+    }
 
     try {
       const response = await axios.post('/api/generate-icn', formData, {
@@ -123,7 +128,7 @@ export default function IcnMakerPage() {
             </div>
 
             <div className="space-y-2">
-              <label className="text-sm font-medium">Sequence Start:</label>
+              <label className="text-sm font-medium">Sequence Start (lowest SQ; numbers already issued are skipped):</label>
               <input
                 type="text"
                 value={params.sq_start}
@@ -165,6 +170,20 @@ export default function IcnMakerPage() {
                 <option value="04">05 - Confidential</option>
               </select>
             </div>
+
+            <div className="space-y-2">
+              <label className="text-sm font-medium">Image optimisation:</label>
+              <select
+                value={imageFormat}
+                onChange={(e) => setImageFormat(e.target.value)}
+                className="w-full p-2 bg-secondary border border-border rounded-md text-foreground"
+              >
+                <option value="">Off - keep images as embedded</option>
+                <option value="auto">Auto - JPEG stays JPEG, others PNG (max 2000px)</option>
+                <option value="png">PNG (max 2000px)</option>
+                <option value="jpeg">JPEG (max 2000px)</option>
+              </select>
+            </div>
           </div>
 
           <div 
@@ -13,13 +13,16 @@ export default function IcnValidatorPage() {
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
   const [results, setResults] = useState(null)
+  const [project, setProject] = useState('')
+  const [mode, setMode] = useState('adoc')
+  const docLabel = mode === 'xml' ? 'XML' : 'ADOC'
 
   const onDropAdoc = useCallback((acceptedFiles) => {
     setAdocFiles(acceptedFiles)
     setError(null)
     setResults(null)
-    addLog(`Selected ${acceptedFiles.length} ADOC file(s)`, 'info')
-  }, [addLog])
+    addLog(`Selected ${acceptedFiles.length} ${docLabel} file(s)`, 'info')
+  }, [addLog, docLabel])
 
   const onDropImages = useCallback((acceptedFiles) => {
     setImageFiles(acceptedFiles)
@@ -31,7 +34,7 @@ export default function IcnValidatorPage() {
   const { getRootProps: getRootPropsAdoc, getInputProps: getInputPropsAdoc, isDragActive: isDragActiveAdoc } = useDropzone({
     onDrop: onDropAdoc,
     accept: {
-      'text/plain': ['.adoc']
+      ...(mode === 'xml' ? { 'application/xml': ['.xml'], 'text/xml': ['.xml'] } : { 'text/plain': ['.adoc'] })
     },
     multiple: true
   })
@@ -42,9 +45,9 @@ export default function IcnValidatorPage() {
   })
 
   const handleValidate = async () => {
-    if (adocFiles.length === 0) {
-      setError('Please select at least one ADOC file')
-      addLog('No ADOC files selected', 'error')
+    if (adocFiles.length === 0 && !project.trim()) {
+      setError(`Please select at least one ${docLabel} file`)
+      addLog(`No ${docLabel} files selected`, 'error')
       return
     }
 
@@ -54,11 +57,17 @@ export default function IcnValidatorPage() {
 
     const formData = new FormData()
     adocFiles.forEach(file => {
-      formData.append('adoc_files', file)
+      formData.append(mode === 'xml' ? 'xml_files' : 'adoc_files', file)
     })
+    formData.append('mode', mode)
     imageFiles.forEach(file => {
-      formData.append('image_files', file)
+      // Projects keep each image's DM folder: drop the image folders, not loose files
+      const relativePath = (file.path || file.name).replace(/^\.?\//, '')
+      formData.append('image_files', file, project.trim() ? relativePath : file.name)
     })
+    if (project.trim()) {
+      formData.append('project', project.trim())
+    }
 
     try {
       const response = await axios.post('/api/validate-icn', formData, {
@@ -89,12 +98,23 @@ export default function IcnValidatorPage() {
         <CardHeader>
           <CardTitle>Validate ICN References</CardTitle>
           <CardDescription>
-            Validate ADOC image references against actual image files. Identifies missing and unused images.
+            Validate ADOC image references, or the ICN references of S1000D XML data modules, against actual image files. Identifies missing and unused images.
           </CardDescription>
         </CardHeader>
         <CardContent className="space-y-6">
           <div className="space-y-4">
-            <h3 className="text-sm font-semibold">ADOC Files</h3>
+            <div className="space-y-2">
+              <label className="text-sm font-medium">Document type:</label>
+              <select
+                value={mode}
+                onChange={(e) => { setMode(e.target.value); setAdocFiles([]); setProject(''); setResults(null) }}
+                className="w-full p-2 bg-secondary border border-border rounded-md text-foreground"
+              >
+                <option value="adoc">AsciiDoc (.adoc)</option>
+                <option value="xml">S1000D data modules (.xml)</option>
+              </select>
+            </div>
+            <h3 className="text-sm font-semibold">{docLabel} Files</h3>
             <div 
               {...getRootPropsAdoc()} 
               className={`border-2 border-dashed rounded-lg p-6 text-center cursor-pointer transition-colors ${
@@ -105,8 +125,8 @@ export default function IcnValidatorPage() {
               <Upload className="h-10 w-10 mx-auto mb-3 text-muted-foreground" />
               <p className="text-sm text-muted-foreground">
                 {isDragActiveAdoc
-                  ? 'Drop ADOC files here...'
-                  : 'Drag & drop ADOC files here, or click to select'}
+                  ? `Drop ${docLabel} files here...`
+                  : `Drag & drop ${docLabel} files here, or click to select`}
               </p>
             </div>
 
@@ -146,6 +166,19 @@ export default function IcnValidatorPage() {
             )}
           </div>
 
+          {mode === 'adoc' && (
+            <div className="space-y-2">
+              <label className="text-sm font-medium">Project (optional):</label>
+              <input
+                type="text"
+                value={project}
+                onChange={(e) => setProject(e.target.value)}
+                placeholder="Keep files between runs; then upload only what changed"
+                className="w-full p-2 bg-secondary border border-border rounded-md text-foreground"
+              />
+            </div>
+          )}
+
           {error && (
             <div className="p-4 bg-destructive/10 border border-destructive/20 rounded-lg text-destructive text-sm">
               {error}
@@ -154,7 +187,7 @@ export default function IcnValidatorPage() {
 
           <Button 
             onClick={handleValidate} 
-            disabled={adocFiles.length === 0 || loading}
+            disabled={(adocFiles.length === 0 && !project.trim()) || loading}
             className="w-full"
           >
             {loading ? 'Validating...' : 'Validate ICN References'}
@@ -204,6 +237,20 @@ export default function IcnValidatorPage() {
                       </div>
                     )}
                     
+                    {result.undeclared && result.undeclared.length > 0 && (
+                      <div className="space-y-2">
+                        <div className="flex items-center gap-2 text-yellow-500">
+                          <AlertTriangle className="h-4 w-4" />
+                          <span className="text-sm font-medium">Undeclared ICN Entities ({result.undeclared.length})</span>
+                        </div>
+                        <ul className="text-xs text-muted-foreground space-y-1 pl-6 list-disc">
+                          {result.undeclared.map((icn, i) => (
+                            <li key={i}>{icn}</li>
+                          ))}
+                        </ul>
+                      </div>
+                    )}
+                    
                     {result.status === 'ok' && (
                       <div className="flex items-center gap-2 text-green-500">
                         <CheckCircle className="h-4 w-4" />